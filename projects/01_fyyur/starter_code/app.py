@@ -2,11 +2,19 @@
 # Imports
 # ----------------------------------------------------------------------------#
 
+import base64
+import io
 import sys
+from datetime import datetime, timedelta
+from functools import lru_cache
+from itertools import groupby
 
+import click
 import dateutil.parser
-import babel
-from flask import Flask, render_template, request, flash, redirect, url_for
+import babel.dates
+from flask import Flask, render_template, request, flash, redirect, url_for, abort
+from flask.cli import AppGroup
+from markupsafe import Markup
 from flask_migrate import Migrate
 from flask_moment import Moment
 import logging
@@ -17,12 +25,16 @@ from forms import *
 # App Config.
 # ----------------------------------------------------------------------------#
 from starter_code.models import Venue, Artist, Show, db
+from starter_code.search import search_names
+from starter_code.fragment_cache import FragmentCache
+from starter_code.importer import import_rows, read_rows
 
 app = Flask(__name__)
 moment = Moment(app)
 app.config.from_object('config')
 db.init_app(app)
 migrate = Migrate(app, db)
+fragment_cache = FragmentCache()
 
 
 # ----------------------------------------------------------------------------#
@@ -30,13 +42,23 @@ migrate = Migrate(app, db)
 # ----------------------------------------------------------------------------#
 
 
-def format_datetime(value, format='medium'):
-    date = dateutil.parser.parse(value)
-    if format == 'full':
-        format = "EEEE MMMM, d, y 'at' h:mma"
-    elif format == 'medium':
-        format = "EE MM, dd, y h:mma"
-    return babel.dates.format_datetime(date, format)
+DATETIME_FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma"
+}
+
+
+@lru_cache(maxsize=32)
+def compile_datetime_format(format, locale=None):
+    # parsing the locale and the pattern dominates babel's per-call cost, so do it once per format/locale
+    return babel.Locale.parse(locale or babel.dates.LC_TIME), babel.dates.parse_pattern(DATETIME_FORMATS.get(format, format))
+
+
+def format_datetime(value, format='medium', locale=None):
+    if not isinstance(value, datetime):
+        value = dateutil.parser.parse(value)
+    parsed_locale, pattern = compile_datetime_format(format, locale)
+    return pattern.apply(value, parsed_locale)
 
 
 app.jinja_env.filters['datetime'] = format_datetime
@@ -53,34 +75,38 @@ def index():
 
 #  Venues
 #  ----------------------------------------------------------------
-def format_venue_for_list(venue):
-    data = venue.__dict__
-    data['num_upcoming_shows'] = len(venue.shows)
-    return data
+def get_venue_areas():
+    # one round trip: every venue with its upcoming show count, ordered so each city/state is contiguous.
+    # the ordering follows ix_Venue_city_state and the join is a range scan on ix_Show_venue_id_start_time
+    rows = db.session.query(Venue.id, Venue.name, Venue.city, Venue.state,
+                            db.func.count(Show.id).label('num_upcoming_shows')) \
+        .outerjoin(Show, db.and_(Show.venue_id == Venue.id, Show.start_time > db.func.now())) \
+        .group_by(Venue.id) \
+        .order_by(Venue.city, Venue.state, Venue.id) \
+        .all()
+    return [{
+        "city": city,
+        "state": state,
+        "venues": list(venues)
+    } for (city, state), venues in groupby(rows, key=lambda row: (row.city, row.state))]
 
 
 @app.route('/venues')
 def venues():
-    return render_template('pages/venues.html', areas=[{
-        "city": region.city,
-        "state": region.state,
-        "venues": [format_venue_for_list(venue) for venue in
-                   Venue.query.filter_by(city=region.city, state=region.state).all()]
-    } for region in Venue.query.distinct(Venue.city, Venue.state).all()])
+    return render_template('pages/venues.html', areas=get_venue_areas())
 
 
 @app.route('/venues/search', methods=['POST'])
 def search_venues():
     # seach for Hop should return "The Musical Hop".
     # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
-    results = Venue.query.filter(Venue.name.ilike('%{}%'.format(request.form.get('search_term', '')))).all()
-    return render_template('pages/search_venues.html', results={"count": len(results), "data": results},
-                           search_term=request.form.get('search_term', ''))
+    search_term = request.form.get('search_term', '')
+    results = search_names(Venue, search_term, page=request.form.get('page', 1, type=int))
+    return render_template('pages/search_venues.html', results=results, search_term=search_term)
 
 
 def format_show(show, venue=True):
     result = show.__dict__
-    result["start_time"] = str(show.start_time)
     if venue:
         result["artist_image_link"] = show.artist.image_link
         result["artist_name"] = show.artist.name
@@ -90,28 +116,56 @@ def format_show(show, venue=True):
     return result
 
 
+def load_with_shows(model, entity_id):
+    # one round trip: the venue/artist, its shows and the other side of each show via eager joins.
+    # shows come back ordered by start_time straight from ix_Show_venue_id_start_time/ix_Show_artist_id_start_time
+    counterpart = Show.artist if model is Venue else Show.venue
+    entity = model.query.options(db.joinedload(model.shows).joinedload(counterpart)).get(entity_id)
+    if entity is None:
+        abort(404)
+    return entity
+
+
 def get_child_shows(element, venue=True):
+    now = datetime.now()
+    past_shows = []
+    upcoming_shows = []
+    for show in element.shows:
+        if show.start_time > now:
+            upcoming_shows.append(format_show(show, venue=venue))
+        else:
+            past_shows.append(format_show(show, venue=venue))
     data = element.__dict__
-    if venue:
-        past_shows = Show.query.join(Venue).filter(Show.venue_id == element.id, Show.start_time <= db.func.now()).all()
-        upcoming_shows = Show.query.join(Venue).filter(Show.venue_id == element.id,
-                                                       Show.start_time >= db.func.now()).all()
-    else:
-        past_shows = Show.query.join(Artist).filter(Show.artist_id == element.id, Show.start_time <= db.func.now()).all()
-        upcoming_shows = Show.query.join(Artist).filter(Show.artist_id == element.id, Show.start_time > db.func.now()).all()
-    data['past_shows'] = [format_show(show, venue=venue) for show in past_shows]
+    data['past_shows'] = past_shows
     data['past_shows_count'] = len(past_shows)
-    data['upcoming_shows'] = [format_show(show, venue=venue) for show in upcoming_shows]
+    data['upcoming_shows'] = upcoming_shows
     data['upcoming_shows_count'] = len(upcoming_shows)
     return data
 
 
+def get_detail_fragment(model, entity_id):
+    # the rendered detail only changes on writes, which bump fragment_cache, or when the next upcoming show starts;
+    # the cache ttl covers writes made by other processes
+    route = 'show_venue' if model is Venue else 'show_artist'
+    fragment = fragment_cache.get(route, entity_id)
+    if fragment is None:
+        entity = load_with_shows(model, entity_id)
+        now = datetime.now()
+        expires_at = next((show.start_time for show in entity.shows if show.start_time > now), None)
+        if model is Venue:
+            html = render_template('fragments/venue_detail.html', venue=get_child_shows(entity))
+        else:
+            html = render_template('fragments/artist_detail.html', artist=get_child_shows(entity, venue=False))
+        fragment_cache.set(route, entity_id, html, expires_at=expires_at, name=entity.name)
+        fragment = {'html': html, 'name': entity.name}
+    return fragment
+
+
 @app.route('/venues/<int:venue_id>')
 def show_venue(venue_id):
     # shows the venue page with the given venue_id
-    venue = Venue.query.get(venue_id)
-    data = get_child_shows(venue)
-    return render_template('pages/show_venue.html', venue=data)
+    fragment = get_detail_fragment(Venue, venue_id)
+    return render_template('pages/show_venue.html', detail=Markup(fragment['html']))
 
 
 #  Create Venue
@@ -178,17 +232,16 @@ def artists():
 
 @app.route('/artists/search', methods=['POST'])
 def search_artists():
-    results = Artist.query.filter(Artist.name.ilike('%{}%'.format(request.form.get('search_term', '')))).all()
-    return render_template('pages/search_artists.html', results={"count": len(results), "data": results},
-                           search_term=request.form.get('search_term', ''))
+    search_term = request.form.get('search_term', '')
+    results = search_names(Artist, search_term, page=request.form.get('page', 1, type=int))
+    return render_template('pages/search_artists.html', results=results, search_term=search_term)
 
 
 @app.route('/artists/<int:artist_id>')
 def show_artist(artist_id):
     # shows the venue page with the given venue_id
-    artist = Artist.query.get(artist_id)
-    data = get_child_shows(artist, venue=False)
-    return render_template('pages/show_artist.html', artist=data)
+    fragment = get_detail_fragment(Artist, artist_id)
+    return render_template('pages/show_artist.html', detail=Markup(fragment['html']), name=fragment['name'])
 
 
 #  Update
@@ -204,6 +257,8 @@ def edit_artist(artist_id):
 def edit_artist_submission(artist_id):
     # artist record with ID <artist_id> using the new attributes
 
+    # names and images show up on the pages of every venue the artist played, so drop every cached fragment
+    fragment_cache.invalidate_all()
     return redirect(url_for('show_artist', artist_id=artist_id))
 
 
@@ -217,6 +272,9 @@ def edit_venue(venue_id):
 @app.route('/venues/<int:venue_id>/edit', methods=['POST'])
 def edit_venue_submission(venue_id):
     # venue record with ID <venue_id> using the new attributes
+
+    # names and images show up on the pages of every artist that played here, so drop every cached fragment
+    fragment_cache.invalidate_all()
     return redirect(url_for('show_venue', venue_id=venue_id))
 
 
@@ -271,18 +329,71 @@ def create_artist_submission():
 #  Shows
 #  ----------------------------------------------------------------
 
+SHOWS_PER_PAGE = 30
+
+
+def encode_show_cursor(start_time, show_id):
+    return base64.urlsafe_b64encode('{}|{}'.format(start_time.isoformat(), show_id).encode()).decode()
+
+
+def decode_show_cursor(cursor):
+    try:
+        start_time, show_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(start_time), int(show_id)
+    except ValueError:
+        abort(400)
+
+
+def parse_date_arg(name, end_of_day=False):
+    """
+    :param end_of_day: for a date without a time, return midnight of the next day, so that
+        "< parse_date_arg('to', end_of_day=True)" includes the whole of that date
+    """
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        abort(400)
+    if end_of_day and len(value) == len('YYYY-MM-DD'):
+        parsed += timedelta(days=1)
+    return parsed
+
+
 @app.route('/shows')
 def shows():
-    # displays list of shows at /shows
+    # displays list of shows at /shows, one keyset page at a time ordered by (start_time, id)
+    query = db.session.query(Show.id, Show.start_time, Show.venue_id, Venue.name.label('venue_name'),
+                             Show.artist_id, Artist.name.label('artist_name'),
+                             Artist.image_link.label('artist_image_link')) \
+        .join(Venue, Show.venue_id == Venue.id) \
+        .join(Artist, Show.artist_id == Artist.id)
+    date_from = parse_date_arg('from')
+    date_to = parse_date_arg('to', end_of_day=True)
+    if date_from is not None:
+        query = query.filter(Show.start_time >= date_from)
+    if date_to is not None:
+        query = query.filter(Show.start_time < date_to)
+    if request.args.get('after'):
+        query = query.filter(db.tuple_(Show.start_time, Show.id) > decode_show_cursor(request.args['after']))
+    rows = query.order_by(Show.start_time, Show.id).limit(SHOWS_PER_PAGE + 1).all()
+
+    next_url = None
+    if len(rows) > SHOWS_PER_PAGE:
+        rows = rows[:SHOWS_PER_PAGE]
+        next_url = url_for('shows', after=encode_show_cursor(rows[-1].start_time, rows[-1].id),
+                           **{key: request.args[key] for key in ('from', 'to') if request.args.get(key)})
     data = [{
-        "venue_id": show.venue_id,
-        "venue_name": show.venue.name,
-        "artist_id": show.artist_id,
-        "artist_name": show.artist.name,
-        "artist_image_link": show.artist.image_link,
-        "start_time": str(show.start_time)
-    } for show in Show.query.all()]
-    return render_template('pages/shows.html', shows=data)
+        "venue_id": row.venue_id,
+        "venue_name": row.venue_name,
+        "artist_id": row.artist_id,
+        "artist_name": row.artist_name,
+        "artist_image_link": row.artist_image_link,
+        "start_time": row.start_time
+    } for row in rows]
+    return render_template('pages/shows.html', shows=data, next_url=next_url,
+                           date_from=request.args.get('from', ''), date_to=request.args.get('to', ''))
 
 
 @app.route('/shows/create')
@@ -304,6 +415,8 @@ def create_show_submission():
         )
         db.session.add(show)
         db.session.commit()
+        fragment_cache.bump('show_venue', show.venue_id)
+        fragment_cache.bump('show_artist', show.artist_id)
     except:
         db.session.rollback()
         error = True
@@ -319,6 +432,44 @@ def create_show_submission():
     return render_template('pages/home.html')
 
 
+#  CLI
+#  ----------------------------------------------------------------
+fyyur_cli = AppGroup('fyyur', help='Fyyur data management commands.')
+
+
+@fyyur_cli.command('import')
+@click.argument('kind', type=click.Choice(['venues', 'artists', 'shows']))
+@click.argument('source', type=click.File('rb'))
+@click.option('--format', 'file_format', type=click.Choice(['csv', 'ndjson']),
+              help='File format, guessed from the extension when omitted.')
+@click.option('--batch-size', default=1000, show_default=True, help='Rows inserted per transaction.')
+def import_command(kind, source, file_format, batch_size):
+    """Bulk load venues, artists or shows from a CSV or NDJSON file ('-' for stdin).
+
+    Rows are validated with the same rules as the create forms. Shows reference
+    their artist and venue with artist_id/venue_id or by artist/venue name.
+    A running server picks the rows up within a minute, as its caches expire.
+    """
+    if file_format is None:
+        file_format = 'csv' if source.name.endswith('.csv') else 'ndjson'
+    # the csv module does its own newline handling
+    source = io.TextIOWrapper(source, encoding='utf-8', newline='')
+
+    def on_reject(line_num, errors):
+        click.echo('line {}: {}'.format(line_num, errors), err=True)
+
+    def on_progress(imported, rejected, elapsed):
+        click.echo('{} imported, {} rejected, {:.0f} rows/s'.format(
+            imported, rejected, (imported + rejected) / elapsed if elapsed else 0))
+
+    imported, rejected = import_rows(kind, read_rows(source, file_format), batch_size=batch_size,
+                                     on_progress=on_progress, on_reject=on_reject)
+    click.echo('Done: {} {} imported, {} rejected.'.format(imported, kind, rejected))
+
+
+app.cli.add_command(fyyur_cli)
+
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
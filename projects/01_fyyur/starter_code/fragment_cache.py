@@ -0,0 +1,95 @@
+import threading
+from collections import OrderedDict, defaultdict
+from datetime import datetime, timedelta
+
+FRAGMENT_CACHE_TTL = 60
+
+
+class FragmentCache:
+    """
+    LRU cache of rendered HTML fragments keyed by (route, entity id, version).
+
+    Writers call bump() for the entities they touch; the next read misses on the new version and the
+    fragment rendered for the old one ages out of the LRU. invalidate_all() covers writes whose effect
+    spans many pages (e.g. a renamed venue appears on every artist page that lists it).
+
+    bump() and invalidate_all() only reach this process, so fragments also expire ttl seconds after
+    they were rendered; that bounds how long writes made by other workers or the import command go
+    unseen.
+    """
+
+    def __init__(self, max_entries=512, max_bytes=8 * 1024 * 1024, ttl=FRAGMENT_CACHE_TTL):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._versions = {}
+        self._generation = 0
+        self._stats = defaultdict(lambda: {'hits': 0, 'misses': 0, 'evictions': 0})
+        self._lock = threading.Lock()
+
+    def _key(self, route, entity_id):
+        # reads must not add a version per page viewed, only bump() writes to _versions
+        return route, entity_id, self._generation, self._versions.get((route, entity_id), 0)
+
+    def get(self, route, entity_id):
+        with self._lock:
+            key = self._key(route, entity_id)
+            entry = self._entries.get(key)
+            if entry is not None and entry['expires_at'] <= datetime.now():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self._stats[route]['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats[route]['hits'] += 1
+            return entry['value']
+
+    def set(self, route, entity_id, html, expires_at=None, **extra):
+        """
+        :param html: the rendered fragment
+        :param expires_at: optional naive datetime after which the fragment is stale regardless of writes,
+            if that comes before the ttl runs out
+        :param extra: small values returned alongside the fragment (e.g. the page title)
+        """
+        size = len(html)
+        if size > self.max_bytes:
+            return
+        max_age = datetime.now() + timedelta(seconds=self.ttl)
+        expires_at = max_age if expires_at is None else min(expires_at, max_age)
+        with self._lock:
+            key = self._key(route, entity_id)
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = {'value': dict(extra, html=html), 'size': size, 'expires_at': expires_at}
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                evicted_key = next(iter(self._entries))
+                self._remove(evicted_key)
+                self._stats[evicted_key[0]]['evictions'] += 1
+
+    def bump(self, route, entity_id):
+        with self._lock:
+            self._versions[(route, entity_id)] = self._versions.get((route, entity_id), 0) + 1
+
+    def invalidate_all(self):
+        with self._lock:
+            self._generation += 1
+            # the new generation is in every key, so the versions bumped so far are no longer needed
+            self._versions.clear()
+
+    def stats(self):
+        """
+        :return: per-route hit/miss/eviction counters plus the current entry count and size in bytes
+        """
+        with self._lock:
+            return {
+                'routes': {route: dict(counters) for route, counters in self._stats.items()},
+                'entries': len(self._entries),
+                'bytes': self._bytes
+            }
+
+    def _remove(self, key):
+        self._bytes -= self._entries.pop(key)['size']
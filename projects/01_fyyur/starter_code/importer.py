@@ -0,0 +1,219 @@
+import csv
+import io
+import json
+import time
+from collections import defaultdict
+from itertools import islice
+
+from werkzeug.datastructures import MultiDict
+
+from forms import VenueForm, ArtistForm, ShowForm
+from starter_code.models import db, Venue, Artist, Show
+
+VENUE_FIELDS = ('name', 'city', 'state', 'address', 'phone', 'image_link', 'facebook_link', 'genres', 'website',
+                'seeking_talent', 'seeking_description')
+ARTIST_FIELDS = ('name', 'city', 'state', 'phone', 'image_link', 'facebook_link', 'genres', 'website',
+                 'seeking_venue', 'seeking_description')
+
+IMPORTS = {
+    'venues': (Venue, VenueForm, VENUE_FIELDS),
+    'artists': (Artist, ArtistForm, ARTIST_FIELDS),
+    'shows': (Show, ShowForm, ('start_time',))
+}
+
+
+# ----------------------------------------------------------------------------#
+# Readers.
+# ----------------------------------------------------------------------------#
+
+def read_rows(source, file_format):
+    """
+    Yields (line number, row dict) from an open CSV or NDJSON file without loading it whole.
+    A CSV source has to be opened with newline='' so quoted cells can span lines.
+    """
+    if file_format == 'csv':
+        reader = csv.DictReader(source)
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for line_num, line in enumerate(source, start=1):
+            if line.strip():
+                try:
+                    yield line_num, json.loads(line)
+                except ValueError:
+                    yield line_num, None
+
+
+def to_formdata(row):
+    # CSV cells hold genres as a comma separated list, NDJSON may use real lists and booleans
+    formdata = MultiDict()
+    for key, value in row.items():
+        if value is None:
+            continue
+        if key == 'genres' and isinstance(value, str):
+            value = [genre.strip() for genre in value.split(',') if genre.strip()]
+        if isinstance(value, bool):
+            value = 'y' if value else 'false'
+        for item in value if isinstance(value, list) else [value]:
+            formdata.add(key, str(item))
+    return formdata
+
+
+# ----------------------------------------------------------------------------#
+# Validation.
+# ----------------------------------------------------------------------------#
+
+def validate_row(kind, row):
+    """
+    Runs the row through the same WTForms form the create pages use.
+    :return: (record dict ready for insert, None) or (None, form errors)
+    """
+    if not isinstance(row, dict):
+        return None, {'row': ['Not a JSON object.']}
+    model, form_class, fields = IMPORTS[kind]
+    form = form_class(formdata=to_formdata(row), meta={'csrf': False})
+    if not form.validate():
+        return None, form.errors
+    record = {field: getattr(form, field).data for field in fields}
+    if kind == 'shows':
+        # a show names its artist/venue by id or by name, both are resolved per batch in resolve_show_references
+        for side in ('artist', 'venue'):
+            ref_id = str(row.get(side + '_id') or '').strip()
+            if ref_id and not ref_id.isdigit():
+                return None, {side + '_id': ['Not a valid id.']}
+            if not ref_id and not row.get(side):
+                return None, {side: ['Either {0} or {0}_id is required.'.format(side)]}
+            record[side + '_id'] = int(ref_id) if ref_id else None
+            record[side] = None if ref_id else row[side]
+    return record, None
+
+
+def resolve_show_references(records):
+    """
+    Maps artist/venue names (or ids) of a batch of shows to existing row ids with one query per side.
+    Names are not unique, so a name shared by several rows is rejected rather than guessed.
+    :return: list of (record, error) where error is None for resolved records
+    """
+    resolved = {}
+    for side, model in (('artist', Artist), ('venue', Venue)):
+        names = {record[side] for record in records if record[side] is not None}
+        ids = {record[side + '_id'] for record in records if record[side + '_id'] is not None}
+        by_name = defaultdict(list)
+        if names:
+            for name, row_id in db.session.query(model.name, model.id).filter(model.name.in_(names)):
+                by_name[name].append(row_id)
+        known_ids = {row_id for (row_id,) in db.session.query(model.id).filter(model.id.in_(ids))} if ids else set()
+        resolved[side] = by_name, known_ids
+
+    results = []
+    for record in records:
+        row = {'start_time': record['start_time']}
+        error = None
+        for side in ('artist', 'venue'):
+            by_name, known_ids = resolved[side]
+            if record[side + '_id'] is not None:
+                row_ids = [record[side + '_id']] if record[side + '_id'] in known_ids else []
+            else:
+                row_ids = by_name.get(record[side], [])
+            row_id = row_ids[0] if len(row_ids) == 1 else None
+            if len(row_ids) > 1:
+                error = {side: ['Ambiguous {0} name {1}, give the {0}_id instead.'.format(side, record[side])]}
+            elif row_id is None:
+                error = {side: ['Unknown {} {}.'.format(side, record[side + '_id'] or record[side])]}
+            row[side + '_id'] = row_id
+        results.append((row, error))
+    return results
+
+
+# ----------------------------------------------------------------------------#
+# Writers.
+# ----------------------------------------------------------------------------#
+
+def to_copy_value(value):
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, list):
+        return '{' + ','.join('"' + str(item).replace('\\', '\\\\').replace('"', '\\"') + '"' for item in value) + '}'
+    return value
+
+
+def copy_batch(model, records):
+    columns = list(records[0].keys())
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for record in records:
+        writer.writerow([to_copy_value(record[column]) for column in columns])
+    buffer.seek(0)
+    cursor = db.session.connection().connection.cursor()
+    cursor.copy_expert('COPY "{}" ({}) FROM STDIN WITH (FORMAT csv, NULL \'\\N\')'.format(
+        model.__tablename__, ', '.join('"{}"'.format(column) for column in columns)), buffer)
+
+
+def insert_batch(model, records):
+    # COPY on Postgres, a single executemany everywhere else; one transaction per batch either way
+    if db.engine.dialect.name == 'postgresql':
+        copy_batch(model, records)
+    else:
+        db.session.execute(model.__table__.insert(), records)
+    db.session.commit()
+
+
+# ----------------------------------------------------------------------------#
+# Import.
+# ----------------------------------------------------------------------------#
+
+def import_rows(kind, rows, batch_size=1000, on_progress=None, on_reject=None):
+    """
+    Validates and inserts (line number, row) pairs in batches of batch_size.
+
+    Rows are inserted in bulk, past the ORM events, and usually from the import command's own process,
+    so a running server sees them once its fragment cache and name index ttls run out.
+
+    :param on_progress: called after every batch with (imported, rejected, elapsed seconds)
+    :param on_reject: called for every rejected row with (line number, errors), including the rows
+        of a batch the database refused
+    :return: (imported, rejected)
+    """
+    model = IMPORTS[kind][0]
+    imported = rejected = 0
+    started = time.monotonic()
+
+    def reject(line_num, errors):
+        nonlocal rejected
+        rejected += 1
+        if on_reject:
+            on_reject(line_num, errors)
+
+    rows = iter(rows)
+    for batch in iter(lambda: list(islice(rows, batch_size)), []):
+        valid = []
+        for line_num, row in batch:
+            record, errors = validate_row(kind, row)
+            if errors:
+                reject(line_num, errors)
+            else:
+                valid.append((line_num, record))
+        if kind == 'shows' and valid:
+            resolved = resolve_show_references([record for _, record in valid])
+            checked = []
+            for (line_num, _), (record, errors) in zip(valid, resolved):
+                if errors:
+                    reject(line_num, errors)
+                else:
+                    checked.append((line_num, record))
+            valid = checked
+        if valid:
+            try:
+                insert_batch(model, [record for _, record in valid])
+                imported += len(valid)
+            except Exception as e:
+                # e.g. a value the database refuses; the whole batch is rolled back
+                db.session.rollback()
+                for line_num, _ in valid:
+                    reject(line_num, {'row': ['Not inserted: {}'.format(e.__class__.__name__)]})
+        if on_progress:
+            on_progress(imported, rejected, time.monotonic() - started)
+
+    return imported, rejected
@@ -0,0 +1,24 @@
+"""keyset index for the shows listing
+
+Revision ID: b7e25d9c3f10
+Revises: 4c1f0e7d2a96
+Create Date: 2026-10-17 11:48:52.907131
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e25d9c3f10'
+down_revision = '4c1f0e7d2a96'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_Show_start_time_id', 'Show', ['start_time', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_Show_start_time_id', table_name='Show')
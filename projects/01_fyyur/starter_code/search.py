@@ -0,0 +1,136 @@
+import threading
+import time
+from collections import defaultdict, namedtuple
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from starter_code.models import db, Venue, Artist
+
+SEARCH_RESULTS_PER_PAGE = 20
+NAME_INDEX_TTL = 60
+
+SearchRow = namedtuple('SearchRow', ['id', 'name'])
+
+
+# ----------------------------------------------------------------------------#
+# In-process index (used when the database has no trigram support, e.g. SQLite).
+# ----------------------------------------------------------------------------#
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class NameIndex:
+    """
+    Inverted index from name trigrams to row ids.
+
+    Rebuilt lazily once a write to the table commits in this process, and after ttl seconds so writes
+    made by other processes (e.g. the import command) are eventually picked up.
+    """
+
+    def __init__(self, model, ttl=NAME_INDEX_TTL):
+        self.model = model
+        self.ttl = ttl
+        self._names = None
+        self._postings = None
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        self._loaded_at = None
+
+    def _load(self):
+        with self._lock:
+            if self._loaded_at is None or time.monotonic() - self._loaded_at >= self.ttl:
+                names = {}
+                postings = defaultdict(set)
+                for row_id, name in db.session.query(self.model.id, self.model.name):
+                    names[row_id] = name or ''
+                    for gram in trigrams(names[row_id].lower()):
+                        postings[gram].add(row_id)
+                self._names, self._postings = names, postings
+                self._loaded_at = time.monotonic()
+            return self._names, self._postings
+
+    def search(self, term):
+        names, postings = self._load()
+        needle = term.lower()
+        grams = trigrams(needle)
+        if grams:
+            lists = sorted((postings.get(gram, set()) for gram in grams), key=len)
+            candidates = set.intersection(*lists)
+        else:
+            candidates = names.keys()
+        matches = [SearchRow(row_id, names[row_id]) for row_id in candidates if needle in names[row_id].lower()]
+        # earliest match first, then the shortest (closest) name
+        matches.sort(key=lambda match: (match.name.lower().find(needle), len(match.name), match.name, match.id))
+        return matches
+
+
+name_indexes = {model: NameIndex(model) for model in (Venue, Artist)}
+
+
+# Invalidate for committed writes only. Tables are collected per session at flush time and their
+# indexes invalidated once the transaction commits, so a rebuild in between can't miss the new row
+# for good, and a rollback leaves the indexes alone.
+
+def _record_write(mapper, connection, target):
+    session = inspect(target).session
+    if session is not None:
+        session.info.setdefault('name_index_writes', set()).add(mapper.class_)
+
+
+for model in name_indexes:
+    for action in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(model, action, _record_write)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_written(session):
+    for model in session.info.pop('name_index_writes', ()):
+        name_indexes[model].invalidate()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_written(session):
+    session.info.pop('name_index_writes', None)
+
+
+# ----------------------------------------------------------------------------#
+# Search.
+# ----------------------------------------------------------------------------#
+
+def escape_like(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def search_names(model, term, page=1, per_page=SEARCH_RESULTS_PER_PAGE):
+    """
+    Case-insensitive substring search on model.name, best matches first.
+
+    On Postgres the ILIKE filter is served by the gin_trgm_ops index and ranked with word_similarity;
+    elsewhere the in-process NameIndex answers the query.
+    :return: dict with the total "count", the current "page" and its "data" as (id, name) rows
+    """
+    page = max(page, 1)
+    offset = (page - 1) * per_page
+    if db.engine.dialect.name == 'postgresql':
+        match = model.name.ilike('%{}%'.format(escape_like(term)), escape='\\')
+        count = db.session.query(db.func.count(model.id)).filter(match).scalar()
+        data = db.session.query(model.id, model.name) \
+            .filter(match) \
+            .order_by(db.func.word_similarity(term, model.name).desc(), model.name, model.id) \
+            .limit(per_page) \
+            .offset(offset) \
+            .all()
+    else:
+        matches = name_indexes[model].search(term)
+        count = len(matches)
+        data = matches[offset:offset + per_page]
+    return {
+        "count": count,
+        "page": page,
+        "has_next": offset + per_page < count,
+        "data": data
+    }
@@ -0,0 +1,75 @@
+'''
+convert_dump.py
+    rewrites a trivia pg_dump so questions.category is an indexed integer foreign key
+
+    python convert_dump.py trivia.psql > trivia_converted.psql
+    python convert_dump.py --in-place trivia.psql
+
+Databases that are already running can be upgraded with migrations/001_question_category_fk.sql.
+'''
+import argparse
+import re
+import sys
+
+FOOTER = '--\n-- PostgreSQL database dump complete\n--'
+
+CREATE_TABLE = re.compile(r'CREATE TABLE (?:public\.)?questions \((?P<columns>.*?)\n\);', re.S)
+CATEGORY_COLUMN = re.compile(r'^(\s+)category [^,\n]+?(,?)$', re.M)
+
+FOREIGN_KEY = '''--
+-- Name: questions category; Type: FK CONSTRAINT; Schema: public; Owner: -
+--
+
+ALTER TABLE ONLY public.questions
+    ADD CONSTRAINT category FOREIGN KEY (category) REFERENCES public.categories(id) ON UPDATE CASCADE ON DELETE SET NULL;
+
+
+'''
+
+INDEX = '''--
+-- Name: ix_questions_category; Type: INDEX; Schema: public; Owner: -
+--
+
+CREATE INDEX ix_questions_category ON public.questions USING btree (category);
+
+
+'''
+
+
+def convert(dump):
+    table = CREATE_TABLE.search(dump)
+    if table is None:
+        raise ValueError('no CREATE TABLE statement for questions in the dump')
+    columns = CATEGORY_COLUMN.sub(r'\1category integer\2', table.group('columns'))
+    dump = dump[:table.start('columns')] + columns + dump[table.end('columns'):]
+
+    additions = ''
+    if 'ix_questions_category' not in dump:
+        additions += INDEX
+    if 'FOREIGN KEY (category)' not in dump:
+        additions += FOREIGN_KEY
+    if additions:
+        if FOOTER in dump:
+            dump = dump.replace(FOOTER, additions + FOOTER)
+        else:
+            dump = dump.rstrip('\n') + '\n\n\n' + additions
+    return dump
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert questions.category in a trivia dump to an indexed integer foreign key.')
+    parser.add_argument('dump', help='path to the .psql file')
+    parser.add_argument('--in-place', action='store_true', help='overwrite the dump instead of writing to stdout')
+    args = parser.parse_args()
+
+    with open(args.dump) as f:
+        converted = convert(f.read())
+    if args.in_place:
+        with open(args.dump, 'w') as f:
+            f.write(converted)
+    else:
+        sys.stdout.write(converted)
+
+
+if __name__ == '__main__':
+    main()
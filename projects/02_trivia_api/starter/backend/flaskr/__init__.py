@@ -1,32 +1,77 @@
 import os
 import sys
 
-from flask import Flask, request, abort, jsonify
+import click
+from flask import Flask, Response, request, abort, jsonify, stream_with_context
+from flask.cli import AppGroup
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
-import random
 
-from backend.models import setup_db, Question, Category
+from backend.models import setup_db, Question, Category, db
+from .bank import ERROR_MESSAGES, validate_question, insert_questions, export_lines, read_lines, import_lines
+from .categories import category_cache
+from .quiz import DIFFICULTIES, START_DIFFICULTY, choose_question, next_difficulty
+from .quiz_sessions import quiz_sessions
+from .search import search_text
+from .versions import conditional
 
 QUESTIONS_PER_PAGE = 10
+MAX_BATCH_SIZE = 1000
+MAX_IMPORT_ERRORS = 100
 
 
-def paginate_questions(request, selection):
-    page = request.args.get('page', 1, type=int)
-    start = (page - 1) * QUESTIONS_PER_PAGE
-    end = start + QUESTIONS_PER_PAGE
+def paginate_questions(request, query):
+    # only the requested page is loaded: ?after=<id> continues after a question id (keyset),
+    # otherwise ?page=<n> is turned into LIMIT/OFFSET
+    query = query.order_by(Question.id)
+    after = request.args.get('after', None, type=int)
+    if after is not None:
+        query = query.filter(Question.id > after)
+    else:
+        page = request.args.get('page', 1, type=int)
+        if page < 1:
+            return []
+        query = query.offset((page - 1) * QUESTIONS_PER_PAGE)
 
-    questions = [question.format() for question in selection]
-    current_questions = questions[start:end]
+    return [question.format() for question in query.limit(QUESTIONS_PER_PAGE).all()]
 
-    return current_questions
 
+def count_questions(query):
+    return query.with_entities(db.func.count(Question.id)).order_by(None).scalar()
 
-def format_categories(categories):
-    formatted = {}
-    for category in categories:
-        formatted[category.id] = category.type
-    return formatted
+
+def get_batch(data, key):
+    items = data.get(key) if isinstance(data, dict) else None
+    if not isinstance(items, list) or len(items) < 1 or len(items) > MAX_BATCH_SIZE:
+        abort(400)
+    return items
+
+
+trivia_cli = AppGroup('trivia', help='Trivia question bank commands.')
+
+
+@trivia_cli.command('import')
+@click.argument('source', type=click.File('rb'))
+@click.option('--batch-size', default=500, show_default=True, help='Questions inserted per transaction.')
+@click.option('--keep-ids', is_flag=True, help='Insert questions under the ids in the file.')
+@click.option('--create-categories', is_flag=True, help='Create missing categories from "category_type".')
+def import_command(source, batch_size, keep_ids, create_categories):
+    """Bulk load questions from an NDJSON file ('-' for stdin), e.g. one written by GET /questions/export.
+
+    Lines are validated with the same rules as POST /questions. With --keep-ids and
+    --create-categories, an export seeds an empty database like trivia.psql does.
+    """
+    def on_reject(line_num, status):
+        click.echo('line {}: {}'.format(line_num, ERROR_MESSAGES[status]), err=True)
+
+    def on_progress(imported, rejected, elapsed):
+        click.echo('{} imported, {} rejected, {:.0f} questions/s'.format(
+            imported, rejected, (imported + rejected) / elapsed if elapsed else 0))
+
+    imported, rejected = import_lines(read_lines(source), batch_size=batch_size, keep_ids=keep_ids,
+                                      create_categories=create_categories,
+                                      on_progress=on_progress, on_reject=on_reject)
+    click.echo('Done: {} questions imported, {} rejected.'.format(imported, rejected))
 
 
 def create_app(test_config=None):
@@ -43,42 +88,54 @@ def create_app(test_config=None):
         return response
 
     @app.route('/categories', methods=['GET'])
+    @conditional('categories', 'questions')  # questions for ?with_counts
     def get_categories():
-        selection = Category.query.order_by(Category.id).all()
+        if request.args.get('with_counts') not in ('1', 'true'):
+            return Response(category_cache.body(), mimetype='application/json')
+
+        # one GROUP BY over the indexed questions.category column, empty categories included
+        rows = db.session.query(Category.id, Category.type, db.func.count(Question.id)) \
+            .outerjoin(Question, Question.category == Category.id) \
+            .group_by(Category.id, Category.type) \
+            .order_by(Category.id) \
+            .all()
         return jsonify({
-            "categories": format_categories(selection),
-            "success": True
+            'categories': {category_id: category_type for category_id, category_type, _ in rows},
+            'question_counts': {category_id: count for category_id, _, count in rows},
+            'success': True
         })
 
     @app.route('/questions', methods=['GET'])
+    @conditional('questions', 'categories')
     def get_questions():
         if len(search_term := request.args.get('search', '')) > 0:
             return search_questions(search_term)
-        all_questions = Question.query.order_by(Question.id).all()
-        current_questions = paginate_questions(request, all_questions)
+        current_questions = paginate_questions(request, Question.query)
 
         if len(current_questions) == 0:
             abort(404)
 
         return jsonify({
-            'total_questions': len(all_questions),
+            'total_questions': count_questions(Question.query),
             'questions': current_questions,
-            'categories': format_categories(Category.query.order_by(Category.id).all()),
+            'categories': category_cache.categories(),
             # 'current_category': Category.query.all()[0].format(),
             'success': True
         })
 
     def search_questions(search_term):
-        questions = Question.query.filter(Question.question.ilike(f'%{search_term}%')).all()
-        paged = paginate_questions(request, questions)
+        page = request.args.get('page', 1, type=int)
+        if page < 1:
+            abort(404)
+        total_questions, paged = search_text(search_term, page, QUESTIONS_PER_PAGE)
 
-        if len(paged) == 0 and len(questions) != 0:
+        if len(paged) == 0 and total_questions != 0:
             # If matching questions exist, but not within that page, we have a bad page
             abort(404)
 
         return jsonify({
             "questions": paged,
-            "total_questions": len(questions),
+            "total_questions": total_questions,
             "success": True
         })
 
@@ -100,79 +157,174 @@ def create_app(test_config=None):
 
     @app.route('/questions', methods=['POST'])
     def create_question():
-        data = request.get_json()
-        question = data.get('question', '')
-        answer = data.get('answer', '')
-        difficulty = data.get('difficulty', 1)
-        category = data.get('category', None)
-        if category is None:
-            abort(400)
+        question, error = validate_question(request.get_json())
+        if error:
+            abort(error)
         try:
-            if len(question) < 1 or len(answer) < 1:
-                abort(400)
-            category = Category.query.filter(Category.id == category).one_or_none()
-            if category is None:
-                abort(404)
-            difficulty = int(difficulty)
-            if difficulty < 1 or difficulty > 5:
-                abort(400)
-            question = Question(
-                question=question,
-                answer=answer,
-                difficulty=difficulty,
-                category=category.id
-            )
             question.insert()
-            return jsonify({
-                'success': True,
-                'created': question.id
-            }), 201
-        except Exception as e:
-            if e.code == 400:
-                abort(400)
-            if e.code == 404:
-                abort(404)
+        except Exception:
+            db.session.rollback()
             abort(422)
+        return jsonify({
+            'success': True,
+            'created': question.id
+        }), 201
+
+    @app.route('/questions/batch', methods=['POST'])
+    def create_questions():
+        items = get_batch(request.get_json(), 'questions')
+        results = []
+        valid = []
+        for index, item in enumerate(items):
+            question, error = validate_question(item)
+            if error:
+                results.append({'index': index, 'status': error, 'message': ERROR_MESSAGES[error]})
+            else:
+                results.append({'index': index, 'status': 201})
+                valid.append((results[-1], question))
+
+        # all valid items go in together, in a single transaction
+        if valid:
+            try:
+                created = insert_questions([question for _, question in valid])
+            except Exception:
+                db.session.rollback()
+                abort(422)
+            for (result, _), question_id in zip(valid, created):
+                result['created'] = question_id
+
+        return jsonify({
+            'success': True,
+            'created': len(valid),
+            'results': results
+        })
+
+    @app.route('/questions/batch', methods=['DELETE'])
+    def delete_questions():
+        items = get_batch(request.get_json(), 'ids')
+        if not all(isinstance(question_id, int) for question_id in items):
+            abort(400)
+
+        # one SELECT, then the ORM deletes every row in a single executemany and transaction
+        questions = Question.query.filter(Question.id.in_(set(items))).all()
+        try:
+            for question in questions:
+                db.session.delete(question)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            abort(422)
+
+        found = {question.id for question in questions}
+        return jsonify({
+            'success': True,
+            'deleted': len(found),
+            'results': [
+                {'id': question_id, 'status': 200} if question_id in found
+                else {'id': question_id, 'status': 404, 'message': ERROR_MESSAGES[404]}
+                for question_id in items
+            ]
+        })
+
+    @app.route('/questions/export', methods=['GET'])
+    @conditional('questions', 'categories')
+    def export_questions():
+        return Response(stream_with_context(export_lines()), mimetype='application/x-ndjson')
+
+    @app.route('/questions/import', methods=['POST'])
+    def import_questions():
+        errors = []
+
+        def on_reject(line_num, status):
+            if len(errors) < MAX_IMPORT_ERRORS:
+                errors.append({'line': line_num, 'status': status, 'message': ERROR_MESSAGES[status]})
+
+        # the body is read line by line as it arrives and inserted batch by batch
+        imported, rejected = import_lines(read_lines(request.stream), on_reject=on_reject)
+        return jsonify({
+            'success': True,
+            'imported': imported,
+            'rejected': rejected,
+            'errors': errors
+        })
 
     @app.route('/categories/<int:category_id>/questions', methods=['GET'])
+    @conditional('questions')
     def get_questions_by_category(category_id):
-        matching_questions = Question.query.order_by(Question.id).filter(Question.category == category_id).all()
+        matching_questions = Question.query.filter(Question.category == category_id)
         current_questions = paginate_questions(request, matching_questions)
+        total_questions = count_questions(matching_questions)
 
-        if len(current_questions) == 0 and len(matching_questions) != 0:
+        if len(current_questions) == 0 and total_questions != 0:
             abort(404)
 
         return jsonify({
-            'total_questions': len(matching_questions),
+            'total_questions': total_questions,
             'questions': current_questions,
             'success': True,
             'current_category': category_id
         })
 
+    def get_quiz_category(data):
+        try:
+            # the frontend sends category ids as strings
+            category_id = int(data['quiz_category'])
+        except (KeyError, TypeError, ValueError):
+            abort(400)
+
+        if category_id != 0 and category_id not in category_cache.categories():
+            abort(400)
+        return category_id
+
+    @app.route('/quizzes/sessions', methods=['POST'])
+    def start_quiz_session():
+        category_id = get_quiz_category(request.get_json())
+        token, total_questions = quiz_sessions.start(category_id)
+        return jsonify({
+            'success': True,
+            'quiz_session': token,
+            'total_questions': total_questions
+        }), 201
+
     @app.route('/quizzes', methods=['POST'])
     def play_game():
         data = request.get_json()
-        category_id = data['quiz_category']
+        if 'quiz_session' in data:
+            try:
+                question = quiz_sessions.next_question(data['quiz_session'])
+            except KeyError:
+                abort(404)
+            return jsonify({
+                'success': True,
+                'question': question
+            })
+
         previous = data['previous_questions']
+        category_id = get_quiz_category(data)
+        if not data.get('adaptive', False):
+            return jsonify({
+                'success': True,
+                'question': choose_question(category_id, previous)
+            })
 
-        category = Category.query.filter(Category.id == category_id).one_or_none()
-        if category is None and category_id != 0:
+        # the client echoes back the difficulty of the last response along with how it went
+        try:
+            difficulty = int(data.get('difficulty', START_DIFFICULTY))
+        except (TypeError, ValueError):
             abort(400)
-
-        query = Question.query.filter(Question.id.notin_(previous))
-        if category_id != 0:
-            query = query.filter(Question.category == category_id)
-        matching_questions = query.all()
-
-        question = None
-        if len(matching_questions) > 0:
-            question = random.choice(matching_questions).format()
+        last_correct = data.get('last_correct', None)
+        if difficulty not in DIFFICULTIES or last_correct not in (True, False, None):
+            abort(400)
+        difficulty = next_difficulty(difficulty, last_correct)
 
         return jsonify({
             'success': True,
-            'question': question
+            'question': choose_question(category_id, previous, target=difficulty),
+            'difficulty': difficulty
         })
 
+    app.cli.add_command(trivia_cli)
+
     @app.errorhandler(400)
     def bad_request(error):
         return jsonify({
@@ -0,0 +1,188 @@
+import json
+import time
+from itertools import islice
+
+from backend.models import Question, Category, db
+from .categories import category_cache
+
+ERROR_MESSAGES = {400: 'Bad request', 404: 'Not found', 422: 'Unprocessable entity'}
+IMPORT_BATCH_SIZE = 500
+EXPORT_BATCH_SIZE = 1000
+
+
+# ----------------------------------------------------------------------------#
+# Writes.
+# ----------------------------------------------------------------------------#
+
+def validate_question(data):
+    """
+    Applies the rules shared by single, batch and imported question creation.
+    :return: (unsaved Question, None) or (None, error status code)
+    """
+    if not isinstance(data, dict) or data.get('category', None) is None:
+        return None, 400
+    question = data.get('question', '')
+    answer = data.get('answer', '')
+    if not isinstance(question, str) or not isinstance(answer, str) or len(question) < 1 or len(answer) < 1:
+        return None, 400
+    try:
+        category = int(data['category'])
+        difficulty = int(data.get('difficulty', 1))
+    except (TypeError, ValueError):
+        return None, 400
+    if category not in category_cache.categories():
+        return None, 404
+    if difficulty < 1 or difficulty > 5:
+        return None, 400
+    return Question(question=question, answer=answer, difficulty=difficulty, category=category), None
+
+
+def allocate_question_ids(count):
+    # with the ids known up front the ORM inserts all rows in one executemany,
+    # instead of one INSERT ... RETURNING per row
+    if db.engine.dialect.name != 'postgresql':
+        return [None] * count
+    return [question_id for (question_id,) in db.session.execute(
+        "SELECT nextval(pg_get_serial_sequence('questions', 'id')) FROM generate_series(1, :count)",
+        {'count': count}
+    )]
+
+
+def insert_questions(questions):
+    """
+    Inserts questions in a single transaction; on failure the caller rolls back.
+    :return: the ids of the questions, in order
+    """
+    unnumbered = [question for question in questions if question.id is None]
+    for question, question_id in zip(unnumbered, allocate_question_ids(len(unnumbered))):
+        question.id = question_id
+    db.session.add_all(questions)
+    db.session.flush()
+    # read before the commit expires the instances, or every id would cost a refresh SELECT
+    ids = [question.id for question in questions]
+    db.session.commit()
+    return ids
+
+
+def sync_sequence(model):
+    # rows inserted with explicit ids leave the serial sequence behind; is_called=false makes the
+    # next id max(id) + 1, and 1 for an empty table
+    if db.engine.dialect.name == 'postgresql':
+        table = model.__tablename__
+        db.session.execute(
+            "SELECT setval(pg_get_serial_sequence('{0}', 'id'), coalesce(max(id), 0) + 1, false) FROM {0}".format(table))
+        db.session.commit()
+
+
+# ----------------------------------------------------------------------------#
+# Export.
+# ----------------------------------------------------------------------------#
+
+def export_lines(batch_size=EXPORT_BATCH_SIZE):
+    """
+    Yields the question bank as NDJSON, batch_size lines per chunk, in id order.
+
+    Rows come from a server-side cursor (stream_results) and are fetched batch_size at a time,
+    so memory use does not grow with the size of the bank. Each line carries the category type
+    so an export can seed an empty database.
+    """
+    rows = db.session.query(Question.id, Question.question, Question.answer, Question.difficulty,
+                            Question.category, Category.type) \
+        .outerjoin(Category, Category.id == Question.category) \
+        .order_by(Question.id) \
+        .execution_options(stream_results=True) \
+        .yield_per(batch_size)
+    rows = iter(rows)
+    for batch in iter(lambda: list(islice(rows, batch_size)), []):
+        yield ''.join(json.dumps({
+            'id': question_id,
+            'question': question,
+            'answer': answer,
+            'difficulty': difficulty,
+            'category': category,
+            'category_type': category_type
+        }, sort_keys=True) + '\n' for question_id, question, answer, difficulty, category, category_type in batch)
+
+
+# ----------------------------------------------------------------------------#
+# Import.
+# ----------------------------------------------------------------------------#
+
+def read_lines(source):
+    """Yields (line number, parsed object or None) from an NDJSON file or stream without loading it whole."""
+    for line_num, line in enumerate(source, start=1):
+        if line.strip():
+            try:
+                yield line_num, json.loads(line)
+            except ValueError:
+                yield line_num, None
+
+
+def create_missing_categories(items):
+    known = category_cache.categories()
+    missing = {}
+    for item in items:
+        if isinstance(item, dict) and item.get('category_type') and str(item.get('category')).isdigit():
+            category_id = int(item['category'])
+            if category_id not in known:
+                missing[category_id] = item['category_type']
+    if missing:
+        for category_id, category_type in missing.items():
+            category = Category(type=category_type)
+            category.id = category_id
+            db.session.add(category)
+        db.session.commit()
+        sync_sequence(Category)
+
+
+def import_lines(lines, batch_size=IMPORT_BATCH_SIZE, keep_ids=False, create_categories=False,
+                 on_progress=None, on_reject=None):
+    """
+    Validates and inserts (line number, object) pairs in transactions of batch_size questions.
+
+    :param keep_ids: insert questions under the "id" of their line instead of a new one
+    :param create_categories: create categories named by "category_type" that do not exist yet
+    :param on_progress: called after every batch with (imported, rejected, elapsed seconds)
+    :param on_reject: called for every rejected line with (line number, status code)
+    :return: (imported, rejected)
+    """
+    imported = rejected = 0
+    started = time.monotonic()
+
+    def reject(line_num, status):
+        nonlocal rejected
+        rejected += 1
+        if on_reject:
+            on_reject(line_num, status)
+
+    lines = iter(lines)
+    for batch in iter(lambda: list(islice(lines, batch_size)), []):
+        if create_categories:
+            create_missing_categories([item for _, item in batch])
+        valid = []
+        for line_num, item in batch:
+            question, error = validate_question(item)
+            if error is None and keep_ids and item.get('id') is not None:
+                try:
+                    question.id = int(item['id'])
+                except (TypeError, ValueError):
+                    error = 400
+            if error:
+                reject(line_num, error)
+            else:
+                valid.append((line_num, question))
+        if valid:
+            try:
+                insert_questions([question for _, question in valid])
+                imported += len(valid)
+            except Exception:
+                # e.g. an id that is already taken; the whole batch is rolled back
+                db.session.rollback()
+                for line_num, _ in valid:
+                    reject(line_num, 422)
+        if on_progress:
+            on_progress(imported, rejected, time.monotonic() - started)
+
+    if keep_ids:
+        sync_sequence(Question)
+    return imported, rejected
@@ -0,0 +1,93 @@
+import json
+import threading
+import time
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from backend.models import Category
+
+CATEGORY_CACHE_TTL = 300
+
+
+def format_categories(categories):
+    formatted = {}
+    for category in categories:
+        formatted[category.id] = category.type
+    return formatted
+
+
+class CategoryCache:
+    """
+    Process-wide copy of the category map.
+
+    Categories almost never change, so they are read once and served from memory until the cache
+    is invalidated, either explicitly, once a write to the categories table commits in this process, or when
+    the ttl runs out. Each reload bumps the version.
+    """
+
+    def __init__(self, ttl=CATEGORY_CACHE_TTL):
+        self.ttl = ttl
+        self.version = 0
+        self._snapshot = None
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        self._loaded_at = None
+
+    def _is_fresh(self):
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl
+
+    def _load(self):
+        if not self._is_fresh():
+            with self._lock:
+                if not self._is_fresh():
+                    categories = format_categories(Category.query.order_by(Category.id).all())
+                    # serialized once, in the same key order jsonify would use
+                    body = json.dumps({"categories": categories, "success": True}, sort_keys=True).encode()
+                    self._snapshot = categories, body
+                    self.version += 1
+                    self._loaded_at = time.monotonic()
+        return self._snapshot
+
+    def categories(self):
+        """
+        :return: dict of category id to type, shared between requests and not to be modified
+        """
+        return self._load()[0]
+
+    def body(self):
+        """
+        :return: the pre-serialized {"categories": ..., "success": true} JSON body as bytes
+        """
+        return self._load()[1]
+
+
+category_cache = CategoryCache()
+
+
+# Invalidate for committed writes only. Writes are noted per session at flush time and the cache is
+# invalidated once the transaction commits, so a reload in between can't cache the old categories
+# for a full ttl, and a rollback leaves the cache alone.
+
+def _record_write(mapper, connection, target):
+    session = inspect(target).session
+    if session is not None:
+        session.info['categories_written'] = True
+
+
+for action in ('after_insert', 'after_update', 'after_delete'):
+    event.listen(Category, action, _record_write)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_written(session):
+    if session.info.pop('categories_written', False):
+        category_cache.invalidate()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_written(session):
+    session.info.pop('categories_written', None)
+
@@ -0,0 +1,226 @@
+import random
+import threading
+import time
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from backend.models import Question, db
+
+QUIZ_INDEX_TTL = 60
+ALL_CATEGORIES = 0
+DIFFICULTIES = range(1, 6)
+START_DIFFICULTY = 3
+# weight of a difficulty level relative to the next closer one to the target
+ADAPTIVE_FALLOFF = 0.25
+
+
+class IdBucket:
+    """Array of question ids with an id -> position map, so adding, removing and sampling are all O(1)."""
+
+    def __init__(self):
+        self.ids = []
+        self.positions = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, question_id):
+        if question_id not in self.positions:
+            self.positions[question_id] = len(self.ids)
+            self.ids.append(question_id)
+
+    def remove(self, question_id):
+        position = self.positions.pop(question_id, None)
+        if position is None:
+            return
+        last = self.ids.pop()
+        if position < len(self.ids):
+            self.ids[position] = last
+            self.positions[last] = position
+
+    def sample(self, excluded):
+        """
+        Picks an id uniformly at random among those not in excluded.
+
+        While at most half of the bucket can be excluded, rejection sampling needs fewer than two draws
+        on average. Past that point (the tail end of a long quiz) the remaining ids are listed instead.
+        """
+        size = len(self.ids)
+        if size == 0:
+            return None
+        if len(excluded) * 2 < size:
+            while True:
+                candidate = self.ids[random.randrange(size)]
+                if candidate not in excluded:
+                    return candidate
+        remaining = [question_id for question_id in self.ids if question_id not in excluded]
+        return random.choice(remaining) if remaining else None
+
+
+class QuizQuestionIndex:
+    """
+    Per-category and per-(category, difficulty) arrays of question ids held in memory for the quiz.
+
+    Inserts and deletes committed through this process are applied incrementally; the index is also
+    rebuilt after ttl seconds so writes made by other processes are eventually picked up.
+    """
+
+    def __init__(self, ttl=QUIZ_INDEX_TTL):
+        self.ttl = ttl
+        self._buckets = None
+        self._levels = None
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        self._loaded_at = None
+
+    def _ensure_loaded(self):
+        if self._loaded_at is None or time.monotonic() - self._loaded_at >= self.ttl:
+            self._buckets = {ALL_CATEGORIES: IdBucket()}
+            self._levels = {}
+            for question_id, category, difficulty in db.session.query(Question.id, Question.category, Question.difficulty):
+                self._add(question_id, category, difficulty)
+            self._loaded_at = time.monotonic()
+
+    def _categories(self, category):
+        # a question whose category was deleted (ON DELETE SET NULL) is only in ALL_CATEGORIES
+        return (ALL_CATEGORIES,) if category is None else (ALL_CATEGORIES, int(category))
+
+    def _add(self, question_id, category, difficulty):
+        for category_id in self._categories(category):
+            self._buckets.setdefault(category_id, IdBucket()).add(question_id)
+            if difficulty is not None:
+                self._levels.setdefault((category_id, difficulty), IdBucket()).add(question_id)
+
+    def add(self, question_id, category, difficulty):
+        with self._lock:
+            if self._buckets is not None:
+                self._add(question_id, category, difficulty)
+
+    def remove(self, question_id, category, difficulty):
+        with self._lock:
+            if self._buckets is not None:
+                for category_id in self._categories(category):
+                    if category_id in self._buckets:
+                        self._buckets[category_id].remove(question_id)
+                    if (category_id, difficulty) in self._levels:
+                        self._levels[(category_id, difficulty)].remove(question_id)
+
+    def choose(self, category_id, previous):
+        """
+        :param category_id: category to draw from, 0 for all categories
+        :param previous: ids of questions already asked
+        :return: a random question id not in previous, or None when the category is exhausted
+        """
+        with self._lock:
+            self._ensure_loaded()
+            bucket = self._buckets.get(int(category_id))
+            if bucket is None:
+                return None
+            return bucket.sample(set(previous))
+
+    def choose_near(self, category_id, target, previous):
+        """
+        Like choose, but favours questions whose difficulty is close to target: a difficulty level is
+        drawn with a weight of its question count times ADAPTIVE_FALLOFF ** distance from target,
+        then a question uniformly within the level. With five levels the draw costs the same at
+        any bank size. Exhausted levels are dropped and the draw repeated.
+        :return: a question id not in previous, or None when the category is exhausted
+        """
+        with self._lock:
+            self._ensure_loaded()
+            excluded = set(previous)
+            weights = {}
+            for difficulty in DIFFICULTIES:
+                level = self._levels.get((int(category_id), difficulty))
+                if level:
+                    weights[difficulty] = len(level) * ADAPTIVE_FALLOFF ** abs(difficulty - target)
+            while weights:
+                difficulty = random.choices(list(weights), weights=list(weights.values()))[0]
+                question_id = self._levels[(int(category_id), difficulty)].sample(excluded)
+                if question_id is not None:
+                    return question_id
+                del weights[difficulty]
+            return None
+
+    def question_ids(self, category_id):
+        """
+        :return: a copy of the ids currently in the category, 0 for all categories
+        """
+        with self._lock:
+            self._ensure_loaded()
+            bucket = self._buckets.get(int(category_id))
+            return list(bucket.ids) if bucket is not None else []
+
+
+quiz_index = QuizQuestionIndex()
+
+
+def next_difficulty(target, last_correct):
+    """Moves the target difficulty one level up after a right answer and one down after a wrong one."""
+    if last_correct is None:
+        return target
+    return min(max(target + (1 if last_correct else -1), DIFFICULTIES[0]), DIFFICULTIES[-1])
+
+
+def choose_question(category_id, previous, target=None):
+    """
+    :param target: difficulty to aim for (adaptive mode), None to pick uniformly
+    :return: a random formatted question from the category that is not in previous, or None
+    """
+    previous = list(previous)
+    while True:
+        if target is None:
+            question_id = quiz_index.choose(category_id, previous)
+        else:
+            question_id = quiz_index.choose_near(category_id, target, previous)
+        if question_id is None:
+            return None
+        question = Question.query.get(question_id)
+        if question is not None:
+            return question.format()
+        # deleted by another process since the index was built
+        previous.append(question_id)
+
+
+# Keep the index in step with committed writes. Changes are collected per session at flush time and
+# only applied once the transaction commits, so rolled back inserts and deletes never reach the index.
+
+def _record_change(session, change):
+    if session is not None:
+        session.info.setdefault('quiz_index_changes', []).append(change)
+
+
+@event.listens_for(Question, 'after_insert')
+def _question_inserted(mapper, connection, target):
+    _record_change(inspect(target).session, (quiz_index.add, target.id, target.category, target.difficulty))
+
+
+@event.listens_for(Question, 'after_update')
+def _question_updated(mapper, connection, target):
+    state = inspect(target)
+    category = state.attrs.category.history
+    difficulty = state.attrs.difficulty.history
+    if category.deleted or difficulty.deleted:
+        old_category = category.deleted[0] if category.deleted else target.category
+        old_difficulty = difficulty.deleted[0] if difficulty.deleted else target.difficulty
+        _record_change(state.session, (quiz_index.remove, target.id, old_category, old_difficulty))
+        _record_change(state.session, (quiz_index.add, target.id, target.category, target.difficulty))
+
+
+@event.listens_for(Question, 'after_delete')
+def _question_deleted(mapper, connection, target):
+    _record_change(inspect(target).session, (quiz_index.remove, target.id, target.category, target.difficulty))
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_changes(session):
+    for apply, *change in session.info.pop('quiz_index_changes', []):
+        apply(*change)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changes(session):
+    session.info.pop('quiz_index_changes', None)
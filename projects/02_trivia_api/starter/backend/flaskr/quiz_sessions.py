@@ -0,0 +1,121 @@
+import random
+import secrets
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+from backend.models import Question
+from .quiz import quiz_index
+
+QUIZ_SESSION_TTL = 60 * 60
+MAX_QUIZ_SESSIONS = 10000
+MAX_QUIZ_DECK_ENTRIES = 1000000
+
+
+class QuizSessionBackend(ABC):
+    """
+    Storage for quiz decks. A deck is a list of question ids, popped from the end.
+
+    The in-memory backend below suits a single process; a shared store (e.g. a Redis list per token
+    with LPUSH/RPOP and EXPIRE) can be swapped in by implementing the same three methods.
+    """
+
+    @abstractmethod
+    def create(self, token, deck):
+        pass
+
+    @abstractmethod
+    def pop(self, token):
+        """
+        :return: the next question id, or None once the deck is empty
+        :raises KeyError: if the session is unknown or has expired
+        """
+
+    @abstractmethod
+    def delete(self, token):
+        pass
+
+
+class MemoryQuizSessionBackend(QuizSessionBackend):
+    """
+    Bounded in-process store: sessions expire ttl seconds after their last turn, and the oldest are
+    evicted first once there are more than max_sessions of them or their decks hold more than
+    max_entries question ids in total. A deck is a whole category, so the entry cap is what bounds
+    memory when the bank is large.
+    """
+
+    def __init__(self, max_sessions=MAX_QUIZ_SESSIONS, max_entries=MAX_QUIZ_DECK_ENTRIES, ttl=QUIZ_SESSION_TTL):
+        self.max_sessions = max_sessions
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._sessions = OrderedDict()
+        self._entries = 0
+        self._lock = threading.Lock()
+
+    def _evict(self, token):
+        _, deck = self._sessions.pop(token)
+        self._entries -= len(deck)
+
+    def create(self, token, deck):
+        with self._lock:
+            if token in self._sessions:
+                self._evict(token)
+            self._sessions[token] = (time.monotonic(), deck)
+            self._entries += len(deck)
+            # the new session is last, so it is kept even if its deck alone is over max_entries
+            while len(self._sessions) > 1 and (
+                    len(self._sessions) > self.max_sessions or self._entries > self.max_entries):
+                self._evict(next(iter(self._sessions)))
+
+    def pop(self, token):
+        with self._lock:
+            touched_at, deck = self._sessions[token]
+            now = time.monotonic()
+            if now - touched_at >= self.ttl:
+                self._evict(token)
+                raise KeyError(token)
+            self._sessions[token] = (now, deck)
+            self._sessions.move_to_end(token)
+            if not deck:
+                return None
+            self._entries -= 1
+            return deck.pop()
+
+    def delete(self, token):
+        with self._lock:
+            if token in self._sessions:
+                self._evict(token)
+
+
+class QuizSessions:
+    def __init__(self, backend):
+        self.backend = backend
+
+    def start(self, category_id):
+        """
+        Shuffles the category's question ids into a new deck.
+        :return: (session token, number of questions in the deck)
+        """
+        deck = quiz_index.question_ids(category_id)
+        random.shuffle(deck)
+        token = secrets.token_urlsafe(16)
+        self.backend.create(token, deck)
+        return token, len(deck)
+
+    def next_question(self, token):
+        """
+        :return: the next formatted question of the session, or None when the deck is used up
+        :raises KeyError: if the session is unknown or has expired
+        """
+        while True:
+            question_id = self.backend.pop(token)
+            if question_id is None:
+                return None
+            question = Question.query.get(question_id)
+            if question is not None:
+                return question.format()
+            # deleted since the deck was shuffled
+
+
+quiz_sessions = QuizSessions(MemoryQuizSessionBackend())
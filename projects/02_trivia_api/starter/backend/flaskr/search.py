@@ -0,0 +1,230 @@
+import math
+import re
+import threading
+import time
+from collections import defaultdict
+
+from markupsafe import escape
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from backend.models import QUESTION_SEARCH_DOCUMENT, Question, db
+
+SEARCH_CONFIG = "'english'"
+SEARCH_INDEX_TTL = 300
+# ts_headline marks matches with control characters, which are swapped for <mark> tags once the
+# headline has been HTML-escaped
+START_SEL = '\x02'
+STOP_SEL = '\x03'
+HEADLINE_OPTIONS = 'StartSel="{}", StopSel="{}", MaxWords=35, MinWords=15'.format(START_SEL, STOP_SEL)
+
+TOKEN = re.compile(r'\w+')
+
+
+def tokenize(text):
+    return TOKEN.findall((text or '').lower())
+
+
+def highlight(text, terms):
+    """
+    :return: text HTML-escaped, with whole-word matches of terms wrapped in <mark> tags
+    """
+    if not text or not terms:
+        return str(escape(text)) if text else text
+    pattern = re.compile(r'\b({})\b'.format('|'.join(re.escape(term) for term in terms)), re.I)
+    # split on the raw text, so a term can't match inside an entity such as &amp;
+    parts = pattern.split(text)
+    return ''.join(str(escape(part)) if index % 2 == 0 else '<mark>{}</mark>'.format(escape(part))
+                   for index, part in enumerate(parts))
+
+
+def mark_headline(headline):
+    if headline is None:
+        return None
+    return str(escape(headline)).replace(START_SEL, '<mark>').replace(STOP_SEL, '</mark>')
+
+
+class QuestionSearchIndex:
+    """
+    In-process inverted index from question and answer words to question ids, used when the
+    database has no full-text search (e.g. SQLite).
+
+    Writes committed through this process are applied incrementally; the index is also rebuilt
+    after ttl seconds so writes made by other processes are eventually picked up.
+
+    Words are matched whole and unstemmed; every word of the search term has to appear in the
+    question or its answer, as with plainto_tsquery on Postgres.
+    """
+
+    def __init__(self, ttl=SEARCH_INDEX_TTL):
+        self.ttl = ttl
+        self._lengths = None
+        self._tokens = None
+        self._postings = None
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        self._loaded_at = None
+
+    def _ensure_loaded(self):
+        if self._loaded_at is None or time.monotonic() - self._loaded_at >= self.ttl:
+            self._lengths = {}
+            self._tokens = {}
+            self._postings = defaultdict(dict)
+            for question_id, question, answer in db.session.query(Question.id, Question.question, Question.answer):
+                self._add(question_id, question, answer)
+            self._loaded_at = time.monotonic()
+
+    def _add(self, question_id, question, answer):
+        tokens = tokenize(question) + tokenize(answer)
+        self._lengths[question_id] = len(tokens)
+        self._tokens[question_id] = set(tokens)
+        for token in tokens:
+            frequencies = self._postings[token]
+            frequencies[question_id] = frequencies.get(question_id, 0) + 1
+
+    def _remove(self, question_id):
+        self._lengths.pop(question_id, None)
+        for token in self._tokens.pop(question_id, ()):
+            frequencies = self._postings.get(token)
+            if frequencies is not None:
+                frequencies.pop(question_id, None)
+                if not frequencies:
+                    del self._postings[token]
+
+    def put(self, question_id, question, answer):
+        """
+        Indexes a created question, or re-indexes an updated one. Call after the write is committed.
+        """
+        with self._lock:
+            if self._loaded_at is not None:
+                self._remove(question_id)
+                self._add(question_id, question, answer)
+
+    def remove(self, question_id):
+        """
+        Drops a deleted question from the index. Call after the delete is committed.
+        """
+        with self._lock:
+            if self._loaded_at is not None:
+                self._remove(question_id)
+
+    def search(self, terms):
+        """
+        :return: ids of the questions containing every term, best match first
+        """
+        with self._lock:
+            self._ensure_loaded()
+            lists = sorted((self._postings.get(term, {}) for term in terms), key=len)
+            if not lists or not lists[0]:
+                return []
+            candidates = set(lists[0]).intersection(*lists[1:])
+            # tf-idf, damped by document length so long questions don't win on word count alone
+            weights = [(frequencies, math.log(1 + len(self._lengths) / len(frequencies))) for frequencies in lists]
+            scores = {
+                question_id: sum(frequencies[question_id] * idf for frequencies, idf in weights)
+                / math.sqrt(self._lengths[question_id])
+                for question_id in candidates
+            }
+        return sorted(candidates, key=lambda question_id: (-scores[question_id], question_id))
+
+
+question_search_index = QuestionSearchIndex()
+
+
+# Keep the index in step with committed writes. Changes are collected per session at flush time and
+# only applied once the transaction commits, so rolled back writes never reach the index.
+
+def _record_change(session, change):
+    if session is not None:
+        session.info.setdefault('search_index_changes', []).append(change)
+
+
+@event.listens_for(Question, 'after_insert')
+def _question_inserted(mapper, connection, target):
+    _record_change(inspect(target).session, (question_search_index.put, target.id, target.question, target.answer))
+
+
+@event.listens_for(Question, 'after_update')
+def _question_updated(mapper, connection, target):
+    state = inspect(target)
+    if state.attrs.question.history.has_changes() or state.attrs.answer.history.has_changes():
+        _record_change(state.session, (question_search_index.put, target.id, target.question, target.answer))
+
+
+@event.listens_for(Question, 'after_delete')
+def _question_deleted(mapper, connection, target):
+    _record_change(inspect(target).session, (question_search_index.remove, target.id))
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_changes(session):
+    for apply, *change in session.info.pop('search_index_changes', []):
+        apply(*change)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changes(session):
+    session.info.pop('search_index_changes', None)
+
+
+def format_result(question, question_headline, answer_headline):
+    formatted = question.format()
+    formatted['highlight'] = {'question': question_headline, 'answer': answer_headline}
+    return formatted
+
+
+def search_postgres(term, offset, limit):
+    config = db.literal_column(SEARCH_CONFIG)
+    document = db.literal_column(QUESTION_SEARCH_DOCUMENT)
+    query = db.func.plainto_tsquery(config, term)
+    match = document.op('@@')(query)
+
+    total = db.session.query(db.func.count(Question.id)).filter(match).scalar()
+    rank = db.func.ts_rank_cd(document, query).label('rank')
+    # rank and page first, so ts_headline only runs for the rows that are returned
+    page = db.session.query(Question.id, rank) \
+        .filter(match) \
+        .order_by(rank.desc(), Question.id) \
+        .limit(limit) \
+        .offset(offset) \
+        .subquery()
+    rows = db.session.query(
+        Question,
+        db.func.ts_headline(config, Question.question, query, HEADLINE_OPTIONS),
+        db.func.ts_headline(config, Question.answer, query, HEADLINE_OPTIONS)
+    ) \
+        .join(page, page.c.id == Question.id) \
+        .order_by(page.c.rank.desc(), Question.id) \
+        .all()
+    return total, [format_result(question, mark_headline(question_headline), mark_headline(answer_headline))
+                   for question, question_headline, answer_headline in rows]
+
+
+def search_in_process(term, offset, limit):
+    terms = sorted(set(tokenize(term)))
+    ids = question_search_index.search(terms)
+    page_ids = ids[offset:offset + limit]
+    questions = {question.id: question for question in Question.query.filter(Question.id.in_(page_ids))} if page_ids else {}
+    results = [
+        format_result(questions[question_id], highlight(questions[question_id].question, terms),
+                      highlight(questions[question_id].answer, terms))
+        for question_id in page_ids if question_id in questions
+    ]
+    return len(ids), results
+
+
+def search_text(term, page, per_page):
+    """
+    Full-text search over question and answer text, most relevant first.
+
+    On Postgres the match is served by the ix_questions_search GIN index, ranked with ts_rank_cd and
+    paginated in SQL; elsewhere the in-process QuestionSearchIndex answers the query.
+    :param page: 1-based page number
+    :return: (total number of matches, formatted questions of the page with a "highlight" of each)
+    """
+    offset = (page - 1) * per_page
+    if db.engine.dialect.name == 'postgresql':
+        return search_postgres(term, offset, per_page)
+    return search_in_process(term, offset, per_page)
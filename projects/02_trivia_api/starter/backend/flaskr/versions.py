@@ -0,0 +1,112 @@
+import calendar
+import threading
+import time
+import uuid
+from collections import defaultdict
+from email.utils import formatdate
+from functools import wraps
+
+from flask import Response, make_response, request
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from backend.models import Question, Category
+
+TABLE_VERSION_TTL = 60
+
+
+class TableVersions:
+    """
+    Per-table write counters, used as validators for conditional GETs.
+
+    A table's version is bumped once a transaction that wrote to it commits in this process. Writes
+    made by other processes are not seen, so validators also roll over every ttl seconds; a client
+    then refetches at most once per ttl. The random epoch keeps ETags from a previous run of the
+    server from matching.
+    """
+
+    def __init__(self, ttl=TABLE_VERSION_TTL):
+        self.ttl = ttl
+        self._epoch = uuid.uuid4().hex[:8]
+        self._versions = defaultdict(int)
+        self._modified = {}
+        self._started = time.time()
+        self._lock = threading.Lock()
+
+    def bump(self, *tables):
+        with self._lock:
+            now = time.time()
+            for table in tables:
+                self._versions[table] += 1
+                self._modified[table] = now
+
+    def validators(self, *tables):
+        """
+        :return: (ETag value, Last-Modified timestamp) covering the current state of tables
+        """
+        window = int(time.time() // self.ttl)
+        with self._lock:
+            versions = '-'.join(str(self._versions[table]) for table in tables)
+            modified = max(self._modified.get(table, self._started) for table in tables)
+        return '{}-{}-{}'.format(self._epoch, window, versions), max(modified, window * self.ttl)
+
+
+table_versions = TableVersions()
+
+
+def conditional(*tables):
+    """
+    Answers GETs whose If-None-Match (or If-Modified-Since) still matches the versions of tables
+    with 304 Not Modified, before the view runs, so no query is made.
+
+    The validators are read before the view, so a write committed while it runs changes the ETag
+    of the next request rather than being hidden behind the old one.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            etag, last_modified = table_versions.validators(*tables)
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains_weak(etag)
+            else:
+                since = request.if_modified_since
+                not_modified = since is not None and int(last_modified) <= calendar.timegm(since.utctimetuple())
+            if not_modified:
+                response = Response(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            response.headers['Last-Modified'] = formatdate(last_modified, usegmt=True)
+            # cached copies must be revalidated, which is what makes the 304 path pay off
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return wrapper
+    return decorator
+
+
+# Bump versions for committed writes only. Tables are collected per session at flush time and
+# bumped once the transaction commits; a rollback discards them.
+
+def _record_write(mapper, connection, target):
+    session = inspect(target).session
+    if session is not None:
+        session.info.setdefault('written_tables', set()).add(mapper.local_table.name)
+
+
+for model in (Question, Category):
+    for action in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(model, action, _record_write)
+
+
+@event.listens_for(Session, 'after_commit')
+def _bump_written_tables(session):
+    tables = session.info.pop('written_tables', None)
+    if tables:
+        table_versions.bump(*tables)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_written_tables(session):
+    session.info.pop('written_tables', None)
@@ -0,0 +1,25 @@
+-- Turns questions.category into an indexed integer foreign key to categories.id.
+--
+-- Databases created by db.create_all() before models.py declared the column as an
+-- integer have it as a varchar with neither the constraint nor the index. Safe to run
+-- more than once, including on a database restored from trivia.psql:
+--
+--     psql trivia < migrations/001_question_category_fk.sql
+
+BEGIN;
+
+-- categories that no longer exist would fail the foreign key below
+UPDATE questions SET category = NULL
+WHERE category IS NOT NULL
+  AND category::text NOT IN (SELECT id::text FROM categories);
+
+ALTER TABLE questions
+    ALTER COLUMN category TYPE integer USING category::integer;
+
+ALTER TABLE questions DROP CONSTRAINT IF EXISTS category;
+ALTER TABLE questions
+    ADD CONSTRAINT category FOREIGN KEY (category) REFERENCES categories(id) ON UPDATE CASCADE ON DELETE SET NULL;
+
+CREATE INDEX IF NOT EXISTS ix_questions_category ON questions (category);
+
+COMMIT;
@@ -0,0 +1,10 @@
+-- Full-text index over question and answer text for GET /questions?search=<term>.
+--
+-- db.create_all() creates it on new Postgres databases; existing ones need:
+--
+--     psql trivia < migrations/002_question_search_index.sql
+--
+-- The expression must stay identical to QUESTION_SEARCH_DOCUMENT in models.py.
+
+CREATE INDEX IF NOT EXISTS ix_questions_search ON questions
+    USING gin (to_tsvector('english', coalesce(question, '') || ' ' || coalesce(answer, '')));
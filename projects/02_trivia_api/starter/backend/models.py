@@ -1,5 +1,5 @@
 import os
-from sqlalchemy import Column, String, Integer, create_engine
+from sqlalchemy import Column, String, Integer, ForeignKey, DDL, create_engine, event
 from flask_sqlalchemy import SQLAlchemy
 import json
 
@@ -29,7 +29,7 @@ class Question(db.Model):
   id = Column(Integer, primary_key=True)
   question = Column(String)
   answer = Column(String)
-  category = Column(String)
+  category = Column(Integer, ForeignKey('categories.id', name='category', onupdate='CASCADE', ondelete='SET NULL'), index=True)
   difficulty = Column(Integer)
 
   def __init__(self, question, answer, category, difficulty):
@@ -58,6 +58,19 @@ class Question(db.Model):
       'difficulty': self.difficulty
     }
 
+'''
+ix_questions_search
+    GIN index over the question and answer text, used by full-text search on Postgres.
+    Queries must use QUESTION_SEARCH_DOCUMENT verbatim for the planner to pick the index.
+'''
+QUESTION_SEARCH_DOCUMENT = "to_tsvector('english', coalesce(question, '') || ' ' || coalesce(answer, ''))"
+
+event.listen(
+  Question.__table__,
+  'after_create',
+  DDL('CREATE INDEX IF NOT EXISTS ix_questions_search ON questions USING gin ({})'.format(QUESTION_SEARCH_DOCUMENT))
+    .execute_if(dialect='postgresql'))
+
 '''
 Category
 
@@ -37,6 +37,27 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['success'], True)
         self.assertTrue(data['categories'])
 
+    def test_get_categories_matches_questions_categories(self):
+        res = self.client().get('/categories')
+        data = json.loads(res.data)
+        res2 = self.client().get('/questions')
+        data2 = json.loads(res2.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.content_type, 'application/json')
+        self.assertEqual(data['categories'], data2['categories'])
+
+    def test_get_categories_with_counts(self):
+        res = self.client().get('/categories?with_counts=1')
+        data = json.loads(res.data)
+        res2 = self.client().get('/categories/1/questions')
+        data2 = json.loads(res2.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertEqual(data['categories'].keys(), data['question_counts'].keys())
+        self.assertEqual(data['question_counts']['1'], data2['total_questions'])
+
     def test_get_categories_wrong_method(self):
         res = self.client().post('/categories')
         data = json.loads(res.data)
@@ -56,6 +77,27 @@ class TriviaTestCase(unittest.TestCase):
         self.assertTrue(data['questions'])
         self.assertIsInstance(data['total_questions'], int)
 
+    def test_get_question_not_modified(self):
+        res = self.client().get('/questions')
+        etag = res.headers['ETag']
+        res2 = self.client().get('/questions', headers={'If-None-Match': etag})
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res2.status_code, 304)
+        self.assertEqual(res2.data, b'')
+
+        created = json.loads(self.client().post('/questions', json={
+            'question': "Test question",
+            'answer': "Test answer",
+            'difficulty': 1,
+            'category': 1
+        }).data)['created']
+        res3 = self.client().get('/questions', headers={'If-None-Match': etag})
+        self.client().delete('/questions/{}'.format(created))
+
+        self.assertEqual(res3.status_code, 200)
+        self.assertNotEqual(res3.headers['ETag'], etag)
+
     def test_get_question_missing_page(self):
         res = self.client().get('/questions?page=9999')
         data = json.loads(res.data)
@@ -65,6 +107,20 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['error'], 404)
         self.assertTrue(data['message'])
 
+    def test_get_question_after_cursor(self):
+        res = self.client().get('/questions')
+        first_page = json.loads(res.data)
+        last_id = first_page['questions'][-1]['id']
+
+        res = self.client().get(f'/questions?after={last_id}')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertTrue(data['questions'])
+        self.assertTrue(all(q['id'] > last_id for q in data['questions']))
+        self.assertEqual(data['total_questions'], first_page['total_questions'])
+
     def test_delete_question_success(self):
         res = self.client().delete('/questions/2')
         data = json.loads(res.data)
@@ -166,6 +222,53 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['error'], 404)
         self.assertTrue(data['message'])
 
+    def test_create_and_delete_questions_batch(self):
+        res = self.client().post('/questions/batch', json={'questions': [
+            {'question': "Batch question", 'answer': "Batch answer", 'difficulty': 2, 'category': 1},
+            {'question': "Batch question", 'answer': "Batch answer", 'difficulty': 6, 'category': 1},
+            {'question': "Batch question", 'answer': "Batch answer", 'difficulty': 2, 'category': 99999}
+        ]})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['created'], 1)
+        self.assertEqual([result['status'] for result in data['results']], [201, 400, 404])
+
+        created = data['results'][0]['created']
+        res = self.client().delete('/questions/batch', json={'ids': [created, 99999]})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['deleted'], 1)
+        self.assertEqual([result['status'] for result in data['results']], [200, 404])
+        self.assertIsNone(Question.query.get(created))
+
+    def test_create_questions_batch_empty(self):
+        res = self.client().post('/questions/batch', json={'questions': []})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(data['success'], False)
+
+    def test_export_and_import_questions(self):
+        res = self.client().get('/questions/export')
+        lines = res.data.decode().splitlines()
+        total = Question.query.count()
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.mimetype, 'application/x-ndjson')
+        self.assertEqual(len(lines), total)
+
+        body = lines[0] + '\nnot json\n'
+        res = self.client().post('/questions/import', data=body, content_type='application/x-ndjson')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['imported'], 1)
+        self.assertEqual(data['rejected'], 1)
+        self.assertEqual(data['errors'][0]['line'], 2)
+        self.assertEqual(Question.query.count(), total + 1)
+
     def test_search_questions_success(self):
         res = self.client().get('/questions?search=country')
         data = json.loads(res.data)
@@ -184,6 +287,28 @@ class TriviaTestCase(unittest.TestCase):
         self.assertTrue(data['questions'])
         self.assertIsInstance(data['total_questions'], int)
 
+    def test_search_questions_matches_answers(self):
+        res = self.client().get('/questions?search=scarab')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['total_questions'], 1)
+        self.assertEqual(data['questions'][0]['id'], 23)
+        self.assertIn('<mark>Scarab</mark>', data['questions'][0]['highlight']['answer'])
+
+    def test_search_questions_highlight_escaped(self):
+        res = self.client().post('/questions', json={
+            'question': 'Which Zyzzyva is < 3 & > 1?', 'answer': 'A & B', 'category': 1, 'difficulty': 1})
+        question_id = json.loads(res.data)['created']
+        res = self.client().get('/questions?search=zyzzyva')
+        data = json.loads(res.data)
+        self.client().delete('/questions/{}'.format(question_id))
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['questions'][0]['highlight']['question'],
+                         'Which <mark>Zyzzyva</mark> is &lt; 3 &amp; &gt; 1?')
+        self.assertEqual(data['questions'][0]['highlight']['answer'], 'A &amp; B')
+
     def test_search_questions_bad_page(self):
         res = self.client().get('/questions?search=country&page=9999')
         data = json.loads(res.data)
@@ -250,6 +375,83 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['success'], True)
         self.assertIsNone(data.get('question', None))
 
+    def test_play_quiz_picks_up_new_question(self):
+        res = self.client().post('/questions', json={
+            'question': "Quiz question",
+            'answer': "Quiz answer",
+            'difficulty': 2,
+            'category': 1
+        })
+        created = json.loads(res.data)['created']
+        others = [q.id for q in Question.query.filter(Question.category == 1, Question.id != created).all()]
+
+        res = self.client().post('/quizzes', json={
+            'quiz_category': 1,
+            'previous_questions': others
+        })
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertEqual(data['question']['id'], created)
+
+    def test_play_quiz_adaptive(self):
+        res = self.client().post('/quizzes', json={
+            'quiz_category': 0,
+            'previous_questions': [],
+            'adaptive': True,
+            'difficulty': 4,
+            'last_correct': False
+        })
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertEqual(data['difficulty'], 3)
+        self.assertTrue(data['question'])
+
+    def test_play_quiz_adaptive_bad_difficulty(self):
+        res = self.client().post('/quizzes', json={
+            'quiz_category': 0,
+            'previous_questions': [],
+            'adaptive': True,
+            'difficulty': 9
+        })
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(data['success'], False)
+
+    def test_play_quiz_session_success(self):
+        res = self.client().post('/quizzes/sessions', json={'quiz_category': 5})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(data['success'], True)
+        token = data['quiz_session']
+        total = data['total_questions']
+
+        seen = []
+        for _ in range(total):
+            res = self.client().post('/quizzes', json={'quiz_session': token})
+            data = json.loads(res.data)
+            self.assertEqual(res.status_code, 200)
+            self.assertNotIn(data['question']['id'], seen)
+            seen.append(data['question']['id'])
+
+        res = self.client().post('/quizzes', json={'quiz_session': token})
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 200)
+        self.assertIsNone(data['question'])
+
+    def test_play_quiz_session_unknown(self):
+        res = self.client().post('/quizzes', json={'quiz_session': 'missing'})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 404)
+        self.assertEqual(data['success'], False)
+        self.assertEqual(data['error'], 404)
+
     def test_play_quiz_bad_category(self):
         res = self.client().post('/quizzes', json={
             'quiz_category': 9999,
@@ -1,10 +1,12 @@
 import os
-from flask import Flask, request, jsonify, abort
+from flask import Flask, Response, request, jsonify, abort
 from sqlalchemy import exc
 import json
 from flask_cors import CORS
 
 from .database.models import db_drop_and_create_all, setup_db, Drink
+from .database.menu_cache import menu_cache
+from .database.ingredient_index import ingredient_index
 from .auth.auth import AuthError, requires_auth
 
 app = Flask(__name__)
@@ -31,6 +33,33 @@ def fetch_drinks(long=False, drink_id=None):
     return [drink.short() for drink in q.all()]
 
 
+def menu_response(long=False):
+    """
+    Serves the menu from menu_cache, with an ETag; a request whose If-None-Match matches gets 304
+    without the database being touched
+    """
+    form = 'long' if long else 'short'
+    body, etag = menu_cache.get(form, lambda: json.dumps({
+        "success": True,
+        "drinks": fetch_drinks(long=long)
+    }, sort_keys=True).encode('utf-8'))
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache' if long else 'no-cache'
+    return response.make_conditional(request)
+
+
+def load_recipes():
+    return Drink.query.with_entities(Drink.id, Drink.recipe).all()
+
+
+def written_drinks(drink):
+    # a write answers with the drink it touched; clients that need the whole menu ask with ?full=1
+    if request.args.get('full') in ('1', 'true'):
+        return fetch_drinks(long=True)
+    return [drink.long()]
+
+
 # ROUTES
 
 @app.route('/drinks', methods=['GET'])
@@ -42,9 +71,33 @@ def get_drinks():
     :return: status code 200 and json {"success": True, "drinks": drinks} where drinks is the list of drinks
         or appropriate status code indicating reason for failure
     """
+    return menu_response()
+
+
+@app.route('/drinks/search', methods=['GET'])
+def search_drinks():
+    """
+    GET /drinks/search?ingredient=<name>&color=<color>&mode=<and|or>
+        it should be a public endpoint
+        ingredient and color can be repeated and are matched case-insensitively
+        mode "and" (the default) finds drinks using every ingredient and color, "or" drinks using any
+        it should contain only the drink.short() data representation
+    :return: status code 200 and json {"success": True, "drinks": drinks} where drinks is the list of matching drinks
+        or appropriate status code indicating reason for failure
+    """
+    names = [name for name in request.args.getlist('ingredient') if name.strip()]
+    colors = [color for color in request.args.getlist('color') if color.strip()]
+    mode = request.args.get('mode', 'and').lower()
+    if not names and not colors:
+        abort(400, 'Provide at least one "ingredient" or "color".')
+    if mode not in ('and', 'or'):
+        abort(400, '"mode" must be "and" or "or".')
+
+    drink_ids = ingredient_index.search(names, colors, match_all=mode == 'and', load=load_recipes)
+    drinks = Drink.query.filter(Drink.id.in_(drink_ids)).order_by(Drink.id).all() if drink_ids else []
     return jsonify({
         "success": True,
-        "drinks": fetch_drinks()
+        "drinks": [drink.short() for drink in drinks]
     })
 
 
@@ -59,10 +112,7 @@ def get_drinks_details():
     :return: status code 200 and json {"success": True, "drinks": drinks} where drinks is the list of drinks
         or appropriate status code indicating reason for failure
     """
-    return jsonify({
-        "success": True,
-        "drinks": fetch_drinks(long=True)
-    })
+    return menu_response(long=True)
 
 
 @app.route('/drinks', methods=['POST'])
@@ -75,27 +125,27 @@ def create_drink():
         it should contain the drink.long() data representation
 
     :return: status code 200 and json {"success": True, "drinks": drink} where drink an array containing only the newly
-    created drink or appropriate status code indicating reason for failure
+    created drink (every drink with ?full=1) or appropriate status code indicating reason for failure
     """
     data = request.get_json()
     title = data.get('title', '')
     recipe_obj = data.get('recipe', {})
-    recipe = json.dumps(recipe_obj)
     try:
         if len(title) < 1:
             abort(400, '"title" is a required field in request body.')
         if len(recipe_obj) < 1:
             abort(400, '"recipe" is a required field in request body.')
         validate_recipe(recipe_obj)
-        drink = Drink(title=title, recipe=recipe)
+        drink = Drink(title=title, recipe=recipe_obj)
         drink.insert()
+        ingredient_index.put(drink.id, drink.recipe)
     except Exception as e:
         if e.code in [400]:
             abort(e.code, e.description)
         abort(422)
     return jsonify({
         "success": True,
-        "drinks": fetch_drinks(long=True)
+        "drinks": written_drinks(drink)
     })
 
 
@@ -131,7 +181,7 @@ def update_drink(drink_id):
 
     :param drink_id: is the existing model id
     :return: status code 200 and json {"success": True, "drinks": drink} where drink an array containing only the
-    updated drink or appropriate status code indicating reason for failure
+    updated drink (every drink with ?full=1) or appropriate status code indicating reason for failure
     """
     data = request.get_json()
     if len(data) < 1:
@@ -145,15 +195,16 @@ def update_drink(drink_id):
         if 'recipe' in data:
             recipe_candidate = data['recipe']
             validate_recipe(recipe_candidate)
-            drink.recipe = json.dumps(recipe_candidate)
+            drink.recipe = recipe_candidate
         drink.update()
+        ingredient_index.put(drink.id, drink.recipe)
     except Exception as e:
         if e.code in [400, 404]:
             abort(e.code, e.description)
         abort(422)
     return jsonify({
         'success': True,
-        'drinks': fetch_drinks(long=True, drink_id=drink_id)
+        'drinks': written_drinks(drink)
     })
 
 
@@ -176,6 +227,7 @@ def delete_drink(drink_id):
         if drink is None:
             abort(404)
         drink.delete()
+        ingredient_index.remove(drink_id)
         return jsonify({
             'success': True,
             'delete': drink_id
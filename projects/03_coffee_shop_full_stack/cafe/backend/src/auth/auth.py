@@ -1,13 +1,27 @@
-import json
+import os
 from flask import request, _request_ctx_stack, abort, Response
 from functools import wraps
 from jose import jwt
-from urllib.request import urlopen
+
+from .jwks import JWKSKeyStore
+from .token_cache import VerifiedTokenCache
 
 AUTH0_DOMAIN = 'fsnd-jack.us.auth0.com'
 ALGORITHMS = ['RS256']
 API_AUDIENCE = 'fsnd-cafe'
 
+# JWKS_URL may point at a local file or fixture URL to verify tokens offline
+JWKS_URL = os.environ.get('JWKS_URL', f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
+JWKS_TTL = int(os.environ.get('JWKS_TTL', 600))
+JWKS_MIN_REFRESH_INTERVAL = int(os.environ.get('JWKS_MIN_REFRESH_INTERVAL', 30))
+
+jwks_store = JWKSKeyStore(JWKS_URL, ttl=JWKS_TTL, min_refresh_interval=JWKS_MIN_REFRESH_INTERVAL)
+
+# decoded payloads of already verified tokens, see token_cache.stats() for hit/miss counters
+TOKEN_CACHE_SIZE = int(os.environ.get('TOKEN_CACHE_SIZE', 1024))
+
+token_cache = VerifiedTokenCache(max_size=TOKEN_CACHE_SIZE)
+
 # AuthError Exception
 '''
 AuthError Exception
@@ -93,32 +107,26 @@ def check_permissions(permission, payload):
 def verify_decode_jwt(token):
     """
     it should be an Auth0 token with key id (kid)
-    it should verify the token using Auth0 /.well-known/jwks.json
+    it should verify the token using Auth0 /.well-known/jwks.json (served from jwks_store)
     it should decode the payload from the token
     it should validate the claims
+    it should reuse the payload of a token verified earlier until that token expires
 
     :param token: a json web token (string)
     :return: the decoded payload
     """
-    jsonurl = urlopen(f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
-    jwks = json.loads(jsonurl.read())
+    cached_payload = token_cache.get(token)
+    if cached_payload is not None:
+        return cached_payload
+
     unverified_header = jwt.get_unverified_header(token)
-    rsa_key = {}
     if 'kid' not in unverified_header:
         raise AuthError({
             'code': 'invalid_header',
             'description': 'Authorization malformed.'
         }, 401)
 
-    for key in jwks['keys']:
-        if key['kid'] == unverified_header['kid']:
-            rsa_key = {
-                'kty': key['kty'],
-                'kid': key['kid'],
-                'use': key['use'],
-                'n': key['n'],
-                'e': key['e']
-            }
+    rsa_key = jwks_store.get_key(unverified_header['kid'])
     if rsa_key:
         try:
             payload = jwt.decode(
@@ -129,6 +137,7 @@ def verify_decode_jwt(token):
                 issuer='https://' + AUTH0_DOMAIN + '/'
             )
 
+            token_cache.put(token, payload)
             return payload
 
         except jwt.ExpiredSignatureError:
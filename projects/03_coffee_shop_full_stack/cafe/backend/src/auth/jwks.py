@@ -0,0 +1,117 @@
+import json
+import logging
+import threading
+import time
+from urllib.parse import urlparse
+from urllib.request import urlopen
+
+'''
+JWKSKeyStore
+A process-wide store of the signing keys published in a JWKS document
+'''
+
+logger = logging.getLogger(__name__)
+
+
+class JWKSKeyStore:
+    def __init__(self, url, ttl=600, min_refresh_interval=30, timeout=5):
+        """
+        :param url: location of the JWKS document, either an http(s)/file URL or a local file path
+        :param ttl: seconds a fetched document is considered fresh
+        :param min_refresh_interval: minimum seconds between refreshes triggered by an unknown kid
+        :param timeout: seconds to wait on the network when fetching the document
+        """
+        self.url = url
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
+        self.timeout = timeout
+        self._keys = {}
+        self._fetched_at = None
+        self._last_attempt = None
+        self._lock = threading.Lock()
+        self._background = None
+
+    def get_key(self, kid):
+        """
+        Looks up the key for a kid, fetching the document on first use.
+        A stale document is served while a background refresh runs, and an unknown kid triggers at most
+        one blocking refresh per min_refresh_interval.
+
+        :param kid: key id from the unverified token header
+        :return: the rsa key dict for jwt.decode, or None if the kid is unknown
+        """
+        if self._fetched_at is None:
+            self.refresh()
+        elif self.is_stale():
+            self.refresh_async()
+
+        key = self._keys.get(kid)
+        if key is None and self._may_refresh():
+            self.refresh()
+            key = self._keys.get(kid)
+        return key
+
+    def is_stale(self):
+        return self._fetched_at is None or time.monotonic() - self._fetched_at >= self.ttl
+
+    def refresh(self):
+        """
+        Fetches the document and replaces the indexed keys.
+        Concurrent callers share a single fetch: whoever waited on the lock reuses the result.
+        """
+        requested_at = time.monotonic()
+        with self._lock:
+            if self._fetched_at is not None and self._fetched_at >= requested_at:
+                return
+            self._last_attempt = time.monotonic()
+            self.load(self._fetch())
+
+    def refresh_async(self):
+        """
+        Starts a background refresh unless one is already running or the last attempt was less than
+        min_refresh_interval ago, so a failing endpoint is not retried on every request.
+        """
+        with self._lock:
+            if self._background is not None and self._background.is_alive():
+                return
+            if not self._may_refresh():
+                return
+            self._background = threading.Thread(target=self._refresh_quietly, daemon=True)
+            self._background.start()
+
+    def load(self, jwks):
+        """
+        Indexes the keys of a parsed JWKS document by kid.
+
+        :param jwks: dict with a "keys" list
+        """
+        self._keys = {key['kid']: {
+            'kty': key['kty'],
+            'kid': key['kid'],
+            'use': key['use'],
+            'n': key['n'],
+            'e': key['e']
+        } for key in jwks.get('keys', []) if 'kid' in key}
+        self._fetched_at = time.monotonic()
+
+    def clear(self):
+        self._keys = {}
+        self._fetched_at = None
+        self._last_attempt = None
+
+    def _may_refresh(self):
+        return self._last_attempt is None or time.monotonic() - self._last_attempt >= self.min_refresh_interval
+
+    def _refresh_quietly(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            # keep serving the stale keys, a request after min_refresh_interval will try again
+            logger.warning('JWKS refresh from %s failed: %s', self.url, e)
+
+    def _fetch(self):
+        if urlparse(self.url).scheme in ('http', 'https', 'file'):
+            with urlopen(self.url, timeout=self.timeout) as response:
+                return json.loads(response.read())
+        with open(self.url) as f:
+            return json.load(f)
@@ -0,0 +1,78 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+'''
+VerifiedTokenCache
+A bounded LRU cache of decoded jwt payloads, keyed on a digest of the raw token
+'''
+
+
+class VerifiedTokenCache:
+    def __init__(self, max_size=1024):
+        """
+        :param max_size: maximum number of payloads kept before the least recently used is evicted
+        """
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token):
+        """
+        :param token: a json web token (string)
+        :return: the cached payload, or None if the token was never verified or has expired since
+        """
+        key = self._digest(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.time():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, token, payload):
+        """
+        Stores a verified payload until its exp claim. Payloads without exp are not cached.
+
+        :param token: a json web token (string)
+        :param payload: the payload returned by jwt.decode for that token
+        """
+        expires_at = payload.get('exp')
+        if not isinstance(expires_at, (int, float)) or self.max_size < 1:
+            return
+        key = self._digest(token)
+        with self._lock:
+            self._entries[key] = (expires_at, payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        :return: dict of hit/miss/eviction counters and the current size
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self._entries),
+            'max_size': self.max_size
+        }
+
+    @staticmethod
+    def _digest(token):
+        return hashlib.sha256(token.encode('utf-8')).digest()
@@ -0,0 +1,96 @@
+import os
+import threading
+import time
+
+'''
+IngredientIndex
+An inverted index from normalized ingredient names and colors to the ids of the drinks using them,
+so a search costs about the size of its result instead of parsing every recipe
+'''
+
+INGREDIENT_INDEX_TTL = int(os.environ.get('INGREDIENT_INDEX_TTL', 300))
+
+
+def normalize(text):
+    """
+    :return: text lower-cased with runs of whitespace collapsed, so 'Oat  Milk' finds 'oat milk'
+    """
+    return ' '.join(str(text).lower().split())
+
+
+class IngredientIndex:
+    def __init__(self, ttl=INGREDIENT_INDEX_TTL):
+        """
+        :param ttl: seconds before the index is rebuilt from the database, which bounds how long
+            writes made by other server processes go unseen
+        """
+        self.ttl = ttl
+        self._names = None
+        self._colors = None
+        self._drinks = None
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def _ensure_loaded(self, load):
+        if self._loaded_at is None or time.monotonic() - self._loaded_at >= self.ttl:
+            self._names, self._colors, self._drinks = {}, {}, {}
+            for drink_id, recipe in load():
+                self._add(drink_id, recipe)
+            self._loaded_at = time.monotonic()
+
+    def _add(self, drink_id, recipe):
+        keys = {(normalize(item['name']), normalize(item['color'])) for item in recipe}
+        self._drinks[drink_id] = keys
+        for name, color in keys:
+            self._names.setdefault(name, set()).add(drink_id)
+            self._colors.setdefault(color, set()).add(drink_id)
+
+    def _remove(self, drink_id):
+        for name, color in self._drinks.pop(drink_id, ()):
+            for postings, key in ((self._names, name), (self._colors, color)):
+                ids = postings.get(key)
+                if ids is not None:
+                    ids.discard(drink_id)
+                    if not ids:
+                        del postings[key]
+
+    def put(self, drink_id, recipe):
+        """
+        Indexes a created drink, or re-indexes an updated one. Call after the write is committed.
+        """
+        with self._lock:
+            if self._loaded_at is not None:
+                self._remove(drink_id)
+                self._add(drink_id, recipe)
+
+    def remove(self, drink_id):
+        """
+        Drops a deleted drink from the index. Call after the delete is committed.
+        """
+        with self._lock:
+            if self._loaded_at is not None:
+                self._remove(drink_id)
+
+    def search(self, names, colors, match_all, load):
+        """
+        :param names: ingredient names to look for
+        :param colors: ingredient colors to look for
+        :param match_all: True for drinks having every name and color, False for drinks having any
+        :param load: called when the index needs (re)building, returns (drink id, recipe) pairs
+        :return: sorted ids of the matching drinks
+        """
+        with self._lock:
+            self._ensure_loaded(load)
+            postings = [self._names.get(normalize(name), set()) for name in names] + \
+                       [self._colors.get(normalize(color), set()) for color in colors]
+            if not postings:
+                return []
+            if match_all:
+                postings.sort(key=len)
+                ids = set(postings[0]).intersection(*postings[1:])
+            else:
+                ids = set().union(*postings)
+            return sorted(ids)
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,69 @@
+import hashlib
+import os
+import threading
+import time
+
+'''
+MenuCache
+Pre-serialized JSON bodies of the drink menu (short and long form) with their ETags, kept until the
+menu version is bumped by a drink write or the ttl runs out
+'''
+
+MENU_CACHE_TTL = int(os.environ.get('MENU_CACHE_TTL', 30))
+
+
+class MenuCache:
+    def __init__(self, ttl=MENU_CACHE_TTL):
+        """
+        :param ttl: seconds a snapshot is served before it is rebuilt, which bounds how long writes
+            made by other server processes go unseen (0 disables the cache)
+        """
+        self.ttl = ttl
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self._snapshots = {}
+        self._lock = threading.Lock()
+
+    def bump(self):
+        """
+        Marks the menu as changed. Called by Drink.insert, Drink.update and Drink.delete after their commit.
+        """
+        with self._lock:
+            self.version += 1
+            self._snapshots.clear()
+
+    def get(self, form, render):
+        """
+        :param form: name of the representation, e.g. 'short' or 'long'
+        :param render: called on a miss, returns the JSON body (bytes) for that form
+        :return: (body, etag) where the etag is a digest of the body, so it is the same in every process
+        """
+        with self._lock:
+            snapshot = self._snapshots.get(form)
+            if snapshot is not None and time.monotonic() - snapshot[2] < self.ttl:
+                self.hits += 1
+                return snapshot[0], snapshot[1]
+            self.misses += 1
+            version = self.version
+
+        body = render()
+        snapshot = (body, hashlib.sha1(body).hexdigest(), time.monotonic())
+        with self._lock:
+            # a write committed while rendering makes this body outdated, don't keep it
+            if self.version == version:
+                self._snapshots[form] = snapshot
+        return snapshot[0], snapshot[1]
+
+    def stats(self):
+        """
+        :return: dict of hit/miss counters and the current version
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'version': self.version
+        }
+
+
+menu_cache = MenuCache()
@@ -0,0 +1,66 @@
+'''
+migrate.py
+    upgrades an existing database.db to the current Drink schema
+
+    python src/database/migrate.py [path/to/database.db]
+
+The recipe column used to be declared VARCHAR(180) and held JSON text written by json.dumps.
+SQLite cannot change a column's type in place, so the table is rebuilt with recipe declared
+as JSON; every recipe is parsed on the way, and the migration stops without changing anything
+if one is not valid JSON. Running it again on a migrated database does nothing.
+'''
+import json
+import os
+import sqlite3
+import sys
+
+DRINK_TABLE = '''CREATE TABLE drink_new (
+	id INTEGER NOT NULL, 
+	title VARCHAR(80), 
+	recipe JSON NOT NULL, 
+	PRIMARY KEY (id), 
+	UNIQUE (title)
+)'''
+
+
+def migrate_recipe_to_json(connection):
+    '''
+    Runs inside the caller's transaction.
+    :return: the number of drinks copied, or None when the database was already migrated
+    '''
+    columns = {row[1]: row[2] for row in connection.execute('PRAGMA table_info(drink)')}
+    if not columns or columns.get('recipe', '').upper() == 'JSON':
+        return None
+
+    rows = []
+    invalid = []
+    for drink_id, title, recipe in connection.execute('SELECT id, title, recipe FROM drink ORDER BY id'):
+        try:
+            rows.append((drink_id, title, json.dumps(json.loads(recipe))))
+        except (TypeError, ValueError):
+            invalid.append(drink_id)
+    if invalid:
+        raise ValueError('recipes of drinks {} are not valid JSON, fix them and run again'.format(invalid))
+
+    connection.execute(DRINK_TABLE)
+    connection.executemany('INSERT INTO drink_new (id, title, recipe) VALUES (?, ?, ?)', rows)
+    connection.execute('DROP TABLE drink')
+    connection.execute('ALTER TABLE drink_new RENAME TO drink')
+    return len(rows)
+
+
+if __name__ == '__main__':
+    path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), 'database.db')
+    connection = sqlite3.connect(path)
+    # manage the transaction by hand, so the table rebuild (DDL included) is all or nothing
+    connection.isolation_level = None
+    connection.execute('BEGIN')
+    try:
+        copied = migrate_recipe_to_json(connection)
+        connection.execute('COMMIT')
+    except Exception:
+        connection.execute('ROLLBACK')
+        raise
+    finally:
+        connection.close()
+    print('already up to date' if copied is None else 'migrated {} drinks'.format(copied))
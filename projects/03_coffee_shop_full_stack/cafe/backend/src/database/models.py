@@ -1,14 +1,49 @@
 import os
-from sqlalchemy import Column, String, Integer
+from sqlalchemy import Column, String, Integer, JSON, event
+from sqlalchemy.pool import QueuePool
 from flask_sqlalchemy import SQLAlchemy
 import json
 
+from .menu_cache import menu_cache
+
 database_filename = "database.db"
 project_dir = os.path.dirname(os.path.abspath(__file__))
 database_path = "sqlite:///{}".format(os.path.join(project_dir, database_filename))
 
 db = SQLAlchemy()
 
+'''
+SQLite concurrency profile
+    WAL lets readers carry on while a barista's write is in progress, and busy_timeout makes a
+    second writer wait for the lock instead of failing with "database is locked". With WAL,
+    synchronous=NORMAL only syncs at checkpoints, which is still safe against corruption.
+    Connections are pooled, where SQLAlchemy 1.3 would open a new one per checkout of a file
+    database, so the pragmas run and the page cache warms up once per connection, not per request.
+'''
+
+SQLITE_BUSY_TIMEOUT_MS = 5000
+SQLITE_CACHE_SIZE_KIB = 20000
+
+SQLITE_ENGINE_OPTIONS = {
+    "poolclass": QueuePool,
+    "pool_size": 5,
+    "max_overflow": 10,
+    "pool_timeout": 30,
+    # pooled connections move between request threads, one thread at a time
+    "connect_args": {"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000}
+}
+
+
+def configure_sqlite_connection(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA busy_timeout={}".format(SQLITE_BUSY_TIMEOUT_MS))
+    # negative values are in KiB rather than pages
+    cursor.execute("PRAGMA cache_size=-{}".format(SQLITE_CACHE_SIZE_KIB))
+    cursor.close()
+
+
 '''
 setup_db(app)
     binds a flask application and a SQLAlchemy service
@@ -18,8 +53,10 @@ setup_db(app)
 def setup_db(app):
     app.config["SQLALCHEMY_DATABASE_URI"] = database_path
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = SQLITE_ENGINE_OPTIONS
     db.app = app
     db.init_app(app)
+    event.listen(db.get_engine(app), 'connect', configure_sqlite_connection)
 
 
 '''
@@ -46,35 +83,53 @@ class Drink(db.Model):
     id = Column(Integer().with_variant(Integer, "sqlite"), primary_key=True)
     # String Title
     title = Column(String(80), unique=True)
-    # the ingredients blob - this stores a lazy json blob
+    # the ingredients, stored as JSON and decoded once when the row is loaded
     # the required datatype is [{'color': string, 'name':string, 'parts':number}]
-    recipe = Column(String(180), nullable=False)
+    # assign a new list to change it, changes made inside the list are not detected
+    recipe = Column(JSON, nullable=False)
 
     '''
     short()
         short form representation of the Drink model
+        computed once per instance until title or recipe is assigned, do not modify the result
     '''
 
     def short(self):
-        print(json.loads(self.recipe))
-        short_recipe = [{'color': r['color'], 'parts': r['parts']} for r in json.loads(self.recipe)]
-        return {
-            'id': self.id,
-            'title': self.title,
-            'recipe': short_recipe
-        }
+        representation = self.__dict__.get('_short')
+        if representation is None:
+            representation = {
+                'id': self.id,
+                'title': self.title,
+                'recipe': [{'color': r['color'], 'parts': r['parts']} for r in self.recipe]
+            }
+            self._cache('_short', representation)
+        return representation
 
     '''
     long()
         long form representation of the Drink model
+        computed once per instance until title or recipe is assigned, do not modify the result
     '''
 
     def long(self):
-        return {
-            'id': self.id,
-            'title': self.title,
-            'recipe': json.loads(self.recipe)
-        }
+        representation = self.__dict__.get('_long')
+        if representation is None:
+            representation = {
+                'id': self.id,
+                'title': self.title,
+                'recipe': self.recipe
+            }
+            self._cache('_long', representation)
+        return representation
+
+    def _cache(self, key, representation):
+        # before the first flush the id is still missing, so only cache once there is one
+        if self.id is not None:
+            self.__dict__[key] = representation
+
+    def invalidate_representations(self):
+        self.__dict__.pop('_short', None)
+        self.__dict__.pop('_long', None)
 
     '''
     insert()
@@ -89,6 +144,7 @@ class Drink(db.Model):
     def insert(self):
         db.session.add(self)
         db.session.commit()
+        menu_cache.bump()
 
     '''
     delete()
@@ -102,6 +158,7 @@ class Drink(db.Model):
     def delete(self):
         db.session.delete(self)
         db.session.commit()
+        menu_cache.bump()
 
     '''
     update()
@@ -115,6 +172,20 @@ class Drink(db.Model):
 
     def update(self):
         db.session.commit()
+        menu_cache.bump()
 
     def __repr__(self):
         return json.dumps(self.short())
+
+
+@event.listens_for(Drink.title, 'set')
+@event.listens_for(Drink.recipe, 'set')
+def _drink_changed(target, value, oldvalue, initiator):
+    target.invalidate_representations()
+
+
+@event.listens_for(Drink, 'expire')
+@event.listens_for(Drink, 'refresh')
+def _drink_reloaded(target, *args):
+    # expired or refreshed attributes may come back with another process's changes
+    target.invalidate_representations()